@@ -0,0 +1,78 @@
+"""
+Compares the JSON codecs of :meth:`dataikuapi.DSSClient.set_json_codec` on synthetic payloads shaped like
+the largest bodies the client sends and receives: a batch of records to score, and the details of a model.
+
+Usage: python benchmarks/json_codec_benchmark.py [--records 20000] [--repeat 5]
+
+The codecs that are not installed are skipped.
+"""
+import argparse
+import random
+from dataikuapi.utils import DataikuJSONCodec, dku_timer
+
+def predict_batch(n_records):
+    """A body of predict_records, with numerical, categorical and text features"""
+    rng = random.Random(0)
+    items = []
+    for i in range(n_records):
+        features = {}
+        for j in range(15):
+            features["num_%d" % j] = rng.uniform(-1000, 1000)
+        for j in range(8):
+            features["cat_%d" % j] = "category_%d" % rng.randint(0, 50)
+        features["text"] = " ".join("word%d" % rng.randint(0, 5000) for _ in range(12))
+        features["id"] = i
+        items.append({"features" : features})
+    return {"items" : items}
+
+def model_details(n_trees=100, n_nodes=1000, n_points=20000):
+    """A body of the details of a trained model, with trees, performance curves and predictions"""
+    rng = random.Random(0)
+    trees = []
+    for t in range(n_trees):
+        trees.append({
+            "leftChild" : [rng.randint(-1, n_nodes - 1) for _ in range(n_nodes)],
+            "rightChild" : [rng.randint(-1, n_nodes - 1) for _ in range(n_nodes)],
+            "feature" : [rng.randint(0, 40) for _ in range(n_nodes)],
+            "threshold" : [rng.random() for _ in range(n_nodes)],
+            "predict" : [rng.random() for _ in range(n_nodes)],
+            "nSamples" : [rng.randint(1, 100000) for _ in range(n_nodes)]
+        })
+    return {
+        "trees" : {"featureNames" : ["feature_%d" % i for i in range(41)], "trees" : trees},
+        "perf" : {"rocVizData" : [{"x" : rng.random(), "y" : rng.random(), "p" : rng.random()} for _ in range(n_points)]},
+        "predictions" : [rng.random() for _ in range(n_points)]
+    }
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = dku_timer()
+        fn()
+        elapsed = dku_timer() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the JSON codecs of the DSS client")
+    parser.add_argument("--records", type=int, default=20000, help="the number of records of the predict batch")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of runs of each measure, the best one is kept")
+    args = parser.parse_args()
+
+    batch = predict_batch(args.records)
+    details = model_details()
+    for name in ["json", "orjson", "ujson"]:
+        try:
+            codec = DataikuJSONCodec.get(name)
+        except ImportError:
+            print("%-7s not installed" % name)
+            continue
+        encoded_batch = codec.dumps(batch)
+        encoded_details = codec.dumps(details)
+        encode_time = best_time(lambda: codec.dumps(batch), args.repeat)
+        decode_time = best_time(lambda: codec.loads(encoded_details), args.repeat)
+        print("%-7s encode %dk-record predict batch (%d MB): %5d ms" % (name, args.records // 1000, len(encoded_batch) // 1000000, encode_time * 1000))
+        print("%-7s decode model-details-like body (%d MB):  %5d ms" % (name, len(encoded_details) // 1000000, decode_time * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,154 @@
 import json
+import time
 from requests import Session, exceptions
 from requests import exceptions
 from requests.auth import HTTPBasicAuth
-from .utils import DataikuException
+from .utils import DataikuException, DataikuJSONCodec, dku_gzip_compress
+from .instrumentation import fire_request_hooks
+from .tracing import DSSTracing
 
-class DSSBaseClient(object):
+class DSSClientOptionsMixin(object):
+    """
+    The JSON codec, compression, instrumentation and tracing options shared by :class:`dataikuapi.DSSClient` and
+    the API node clients
+    """
+    def _init_client_options(self):
+        self._json_codec = DataikuJSONCodec.get("json")
+        self._request_compression = None
+        self._request_hooks = []
+        self._tracing = None
+
+    ########################################################
+    # JSON codec
+    ########################################################
+
+    def set_json_codec(self, codec="auto"):
+        """
+        Sets the codec used to encode the JSON bodies of requests and decode the JSON bodies of responses.
+        Faster codecs than the standard library's greatly reduce the time spent on large payloads.
+
+        Note that third-party codecs differ from the standard library on a few corner cases. For example,
+        orjson encodes NaN and infinite floats as null, and only supports 64-bit integers.
+
+        :param str codec: "json" (standard library, the default), "orjson", "ujson", or "auto" for the
+                          fastest of them that is installed
+        """
+        self._json_codec = DataikuJSONCodec.get(codec)
+
+    ########################################################
+    # Compression
+    ########################################################
+
+    def enable_request_compression(self, min_size=1048576, level=6):
+        """
+        Enables gzip compression of the large request bodies sent by this client. The DSS instance must
+        accept gzip-encoded request bodies.
+
+        Responses are always negotiated and decoded with gzip or deflate compression, regardless of this setting.
+
+        :param int min_size: the size in bytes from which request bodies are compressed
+        :param int level: the gzip compression level, from 1 (fastest) to 9 (smallest)
+        """
+        self._request_compression = (min_size, level)
+
+    def disable_request_compression(self):
+        """
+        Disables the request compression enabled by :meth:`enable_request_compression`
+        """
+        self._request_compression = None
+
+    ########################################################
+    # Instrumentation
+    ########################################################
+
+    def add_request_hook(self, hook):
+        """
+        Adds a hook called after each HTTP call performed by this client, including failed ones.
+
+        :param hook: a function taking a :class:`dataikuapi.instrumentation.DSSRequestEvent`. A
+                     :class:`dataikuapi.instrumentation.DSSRequestMetrics` can be used to aggregate latency
+                     histograms and counters per endpoint
+        """
+        self._request_hooks.append(hook)
+
+    def remove_request_hook(self, hook):
+        """
+        Removes a hook added with :meth:`add_request_hook`
+        """
+        self._request_hooks.remove(hook)
+
+    ########################################################
+    # Tracing
+    ########################################################
+
+    def enable_tracing(self, tracer=None):
+        """
+        Enables OpenTelemetry tracing of this client: each HTTP call gets its own client span, and the
+        trace context is injected in the request headers (W3C ``traceparent`` with the default propagator)
+        so that DSS can be attributed its share of latency.
+
+        On a :class:`dataikuapi.DSSClient`, long-running waits (:meth:`dataikuapi.dss.future.DSSFuture.wait_for_result`,
+        :meth:`dataikuapi.dss.scenario.DSSScenario.run_and_wait` and
+        :meth:`dataikuapi.dss.project.DSSProject.start_job_and_wait`) are also wrapped in a parent span,
+        with the number of status polls in its "dss.poll_count" attribute.
+
+        This requires the ``opentelemetry-api`` package, which is only imported when tracing is enabled.
+
+        :param tracer: (optional) the OpenTelemetry tracer to create spans with. Defaults to the "dataikuapi"
+                       tracer of the global tracer provider
+        """
+        self._tracing = DSSTracing(tracer)
+
+    def disable_tracing(self):
+        """
+        Disables the tracing enabled by :meth:`enable_tracing`
+        """
+        self._tracing = None
+
+
+class DSSBaseClient(DSSClientOptionsMixin):
     def __init__(self, base_uri, api_key=None, internal_ticket=None):
         self.api_key = api_key
         self.base_uri = base_uri
         self._session = Session()
+        self._init_client_options()
 
     ########################################################
     # Internal Request handling
     ########################################################
 
     def _perform_http(self, method, path, params=None, body=None, stream=False):
+        headers = None
         if body:
-            body = json.dumps(body)
+            body = self._json_codec.dumps(body)
+            if self._request_compression is not None and len(body) >= self._request_compression[0]:
+                body = dku_gzip_compress(body, self._request_compression[1])
+                headers = {"Content-Encoding" : "gzip"}
 
         auth = HTTPBasicAuth(self.api_key, "")
 
+        url = "%s/%s" % (self.base_uri, path)
+        span = None
+        if self._tracing is not None:
+            (span, headers) = self._tracing.start_request_span(method, path, url, headers)
+        start = time.time()
+        http_res = None
         try:
             http_res = self._session.request(
-                    method, "%s/%s" % (self.base_uri, path),
+                    method, url,
                     params=params, data=body,
-                    auth=auth, stream = stream)
+                    auth=auth, stream = stream,
+                    headers = headers)
             http_res.raise_for_status()
             return http_res
         except exceptions.HTTPError:
             ex = http_res.json()
             raise DataikuException("%s: %s" % (ex.get("errorType", "Unknown error"), ex.get("message", "No message")))
+        finally:
+            if span is not None:
+                self._tracing.end_request_span(span, http_res)
+            if len(self._request_hooks) > 0:
+                fire_request_hooks(self._request_hooks, method, path, http_res, start, stream)
 
     def _perform_empty(self, method, path, params=None, body=None):
         self._perform_http(method, path, params, body, False)
@@ -38,7 +157,7 @@ class DSSBaseClient(object):
         return self._perform_http(method, path, params, body, False).text
 
     def _perform_json(self, method, path, params=None, body=None):
-        return self._perform_http(method, path, params, body, False).json()
+        return self._json_codec.loads(self._perform_http(method, path, params, body, False).content)
 
     def _perform_raw(self, method, path, params=None, body=None):
         return self._perform_http(method, path, params, body, True)
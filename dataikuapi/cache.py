@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+def _copy_json(value):
+    """Copies a decoded JSON value, which is much faster than copy.deepcopy since it only holds dicts, lists and scalars"""
+    t = type(value)
+    if t is dict:
+        return dict((k, _copy_json(v) if type(v) in (dict, list) else v) for (k, v) in value.items())
+    elif t is list:
+        return [_copy_json(v) if type(v) in (dict, list) else v for v in value]
+    else:
+        return value
+
+class DSSResponseCache(object):
+    """
+    A size-bounded LRU cache of the JSON responses of GET calls, with a time-to-live per endpoint.
+
+    Entries are invalidated when the client issues a PUT, POST or DELETE on the same resource path,
+    on one of its sub-resources or on one of its parents.
+
+    Do not create this class directly, instead use :meth:`dataikuapi.DSSClient.enable_response_cache`
+    """
+
+    # read-mostly endpoints cached by default, as path pattern -> time-to-live in seconds
+    DEFAULT_TTLS = {
+        "/admin/connections/" : 60,
+        "/admin/users/" : 60,
+        "/admin/groups/" : 60,
+        "/admin/code-envs/" : 60,
+        "/meanings/" : 60,
+        "/plugins/" : 60,
+        "/projects/*/datasets/" : 30,
+        "/projects/*/datasets/*/schema" : 30
+    }
+
+    def __init__(self, ttls=None, default_ttl=0, max_entries=1000):
+        self.ttls = dict(DSSResponseCache.DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_ttl(self, path):
+        """Gets the time-to-live in seconds of the responses of an endpoint. 0 means not cached"""
+        if path in self.ttls:
+            return self.ttls[path]
+        for (pattern, ttl) in self.ttls.items():
+            if fnmatchcase(path, pattern):
+                return ttl
+        return self.default_ttl
+
+    def fetch(self, path, params, body, fetcher):
+        """
+        Gets the response of a GET call from the cache, or performs it with ``fetcher`` and caches it
+        """
+        ttl = self.get_ttl(path)
+        if ttl <= 0:
+            return fetcher()
+        key = (path, json.dumps(params, sort_keys=True), json.dumps(body, sort_keys=True))
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.entries.pop(key)
+                    self.entries[key] = entry
+                    return _copy_json(entry[2])
+                del self.entries[key]
+        value = fetcher()
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, path.rstrip("/"), _copy_json(value))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, path):
+        """Drops the cached responses of a resource path, of its sub-resources and of its parents"""
+        path = path.rstrip("/")
+        with self.lock:
+            for key in [k for (k, entry) in self.entries.items() if self._is_related(entry[1], path)]:
+                del self.entries[key]
+
+    def clear(self):
+        """Drops all cached responses"""
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def _is_related(cached_path, path):
+        if cached_path == path:
+            return True
+        return cached_path.startswith(path + "/") or path.startswith(cached_path + "/")
+
+
+class DSSConditionalRequestsCache(object):
+    """
+    Remembers the validators (ETag and Last-Modified headers) and decoded bodies of the responses of GET calls,
+    so that the next identical call is sent as a conditional request. When DSS answers that the resource
+    did not change (HTTP 304), the remembered body is returned and neither transferred nor decoded again.
+
+    Do not create this class directly, instead use :meth:`dataikuapi.DSSClient.enable_conditional_requests`
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def fetch(self, path, params, body, fetcher, loads):
+        """
+        Performs a GET call with ``fetcher``, a function taking the headers to add to the request and returning the
+        HTTP response, and returns its JSON body decoded with ``loads``
+        """
+        key = (path, json.dumps(params, sort_keys=True), json.dumps(body, sort_keys=True))
+        with self.lock:
+            entry = self.entries.get(key, None)
+        headers = {}
+        if entry is not None:
+            if entry[0] is not None:
+                headers["If-None-Match"] = entry[0]
+            if entry[1] is not None:
+                headers["If-Modified-Since"] = entry[1]
+        http_res = fetcher(headers)
+        if http_res.status_code == 304 and entry is not None:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.pop(key)
+                    self.entries[key] = entry
+            return _copy_json(entry[2])
+
+        value = loads(http_res.content)
+        etag = http_res.headers.get("ETag", None)
+        last_modified = http_res.headers.get("Last-Modified", None)
+        with self.lock:
+            self.entries.pop(key, None)
+            if etag is not None or last_modified is not None:
+                self.entries[key] = (etag, last_modified, _copy_json(value))
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Forgets all remembered responses"""
+        with self.lock:
+            self.entries.clear()
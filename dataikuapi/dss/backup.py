@@ -0,0 +1,148 @@
+import json
+import os
+import os.path as osp
+import time
+from ..utils import dku_parallel_imap
+
+class DSSProjectsExporter(object):
+    """
+    Exports many projects concurrently to a sink, and records the outcome of each export in a manifest.
+    Projects whose version tag did not change since a previous run are not exported again.
+
+    To simply export projects to a directory, use :meth:`dataikuapi.DSSClient.export_projects`
+
+    :param client: the :class:`dataikuapi.DSSClient` to export with
+    :param int parallelism: the maximum number of concurrent exports
+    :param int retries: the number of times a failed export is retried
+    :param int retry_delay: the number of seconds to wait before retrying a failed export
+    :param dict options: (optional) the export options, as for :meth:`dataikuapi.dss.project.DSSProject.export_to_file`
+    """
+    def __init__(self, client, parallelism=4, retries=2, retry_delay=10, options=None):
+        self.client = client
+        self.parallelism = parallelism
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.options = options if options is not None else {}
+
+    def _export(self, task):
+        (project_key, sink) = task
+        name = "%s.zip" % project_key
+        start = time.time()
+        f = sink.open(name)
+        try:
+            # the exporter retries whole exports, so the download itself is not retried
+            result = self.client.get_project(project_key).export_to_file_object(f, options=self.options, retries=0)
+        except:
+            sink.abort(name, f)
+            raise
+        sink.commit(name, f)
+        result["file"] = name
+        result["duration"] = time.time() - start
+        return result
+
+    def export(self, sink, project_keys=None, skip_unchanged=True):
+        """
+        Exports the projects to a sink, then writes the manifest of the run to the sink.
+
+        The manifest is a dict with the field "projects", a dict of project key to the outcome of its export: a dict with the
+        fields "status" ("DONE", "UNCHANGED" or "FAILED"), "versionTag", "file", "bytesWritten", "sha256", "duration" (in seconds),
+        "exportTime" and, for failed exports, "error". The entries of the previous manifest for the projects that are not part
+        of this run are kept as they are
+
+        :param sink: where to write the exports and the manifest, for example a :class:`DSSExportDirectorySink`
+        :param list project_keys: (optional) the keys of the projects to export. If None, all projects are exported
+        :param bool skip_unchanged: whether to skip the projects whose version tag is the same as in the previous manifest of the sink
+        :returns: the manifest, as a dict
+        """
+        previous = sink.read_manifest()
+        previous_projects = previous.get("projects", {}) if previous is not None else {}
+
+        projects = self.client.list_projects()
+        if project_keys is not None:
+            wanted = set(project_keys)
+            projects = [p for p in projects if p["projectKey"] in wanted]
+
+        manifest = {"createTime" : int(time.time() * 1000), "projects" : {}}
+        version_tags = {}
+        tasks = []
+        for p in projects:
+            project_key = p["projectKey"]
+            version_tag = p.get("versionTag", None)
+            entry = previous_projects.get(project_key, None) if skip_unchanged else None
+            if entry is not None and version_tag is not None and entry.get("versionTag", None) == version_tag \
+                    and entry.get("status", None) in ("DONE", "UNCHANGED") and sink.exists(entry["file"]):
+                entry = dict(entry)
+                entry["status"] = "UNCHANGED"
+                manifest["projects"][project_key] = entry
+                continue
+            version_tags[project_key] = version_tag
+            tasks.append((project_key, sink))
+
+        self.client._ensure_connection_pool_size(self.parallelism)
+        for (task, result, error) in dku_parallel_imap(self._export, tasks, parallelism=self.parallelism,
+                                                       retries=self.retries, retry_delay=self.retry_delay):
+            project_key = task[0]
+            if error is not None:
+                entry = {"status" : "FAILED", "error" : str(error)}
+            else:
+                entry = result
+                entry["status"] = "DONE"
+            entry["versionTag"] = version_tags[project_key]
+            entry["exportTime"] = int(time.time() * 1000)
+            manifest["projects"][project_key] = entry
+
+        for (project_key, entry) in previous_projects.items():
+            if project_key not in manifest["projects"]:
+                manifest["projects"][project_key] = entry
+        sink.write_manifest(manifest)
+        return manifest
+
+
+class DSSExportDirectorySink(object):
+    """
+    Writes project exports to files in a local directory, along with the manifest of the last run (manifest.json).
+
+    Exports are written to a temporary file, which is only renamed when the export completed, so that a failed
+    export never replaces the previous one. To write exports elsewhere, for example to an object store, implement
+    the same methods: ``open``, ``commit``, ``abort``, ``exists``, ``read_manifest`` and ``write_manifest``
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not osp.isdir(directory):
+            os.makedirs(directory)
+
+    def open(self, name):
+        """Opens a file to write an export to, in binary mode"""
+        return open(osp.join(self.directory, name + ".part"), "wb")
+
+    def commit(self, name, f):
+        """Closes a completed export, and makes it replace the previous one"""
+        f.close()
+        target = osp.join(self.directory, name)
+        if osp.exists(target):
+            os.remove(target)
+        os.rename(osp.join(self.directory, name + ".part"), target)
+
+    def abort(self, name, f):
+        """Closes and drops a failed export"""
+        f.close()
+        os.remove(osp.join(self.directory, name + ".part"))
+
+    def exists(self, name):
+        return osp.isfile(osp.join(self.directory, name))
+
+    def read_manifest(self):
+        """Reads the manifest of the last run, or returns None if there is none"""
+        path = osp.join(self.directory, "manifest.json")
+        if not osp.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        path = osp.join(self.directory, "manifest.json")
+        with open(path + ".part", "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        if osp.exists(path):
+            os.remove(path)
+        os.rename(path + ".part", path)
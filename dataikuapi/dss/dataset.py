@@ -1,8 +1,9 @@
 from ..utils import DataikuException
 from ..utils import DataikuUTF8CSVReader
-from ..utils import DataikuStreamedHttpUTF8CSVReader
+from ..utils import DataikuStreamedHttpUTF8CSVReader, dku_copy_stream_to_file, dku_basestring_type
 import json
-from .metrics import ComputedMetrics
+from contextlib import closing
+from .metrics import ComputedMetrics, fetch_metric_histories
 from .discussion import DSSObjectDiscussions
 
 class DSSDataset(object):
@@ -111,10 +112,17 @@ class DSSDataset(object):
     # Dataset data
     ########################################################
 
-    def iter_rows(self, partitions=None):
+    def iter_rows(self, partitions=None, profile=None, prefetch=0):
         """
         Get the dataset's data
         
+        Args:
+            partitions: (optional) the partitions to read
+            profile: (optional) a :class:`dataikuapi.utils.DataikuStreamProfile` in which to record where
+                the time of the iteration is spent (network, tokenization, casting, consumer)
+            prefetch: if > 0, the data is downloaded and decoded on a background thread, up to this
+                number of batches of rows ahead of the consumer. Close the iterator to stop the download early
+
         Return:
             an iterator over the rows, each row being a tuple of values. The order of values
             in the tuples is the same as the order of columns in the schema returned by get_schema
@@ -126,7 +134,56 @@ class DSSDataset(object):
                     "partitions" : partitions
                 })
 
-        return DataikuStreamedHttpUTF8CSVReader(self.get_schema()["columns"], csv_stream).iter_rows()
+        return DataikuStreamedHttpUTF8CSVReader(self.get_schema()["columns"], csv_stream, profile=profile, prefetch=prefetch).iter_rows()
+
+    def iter_column_batches(self, partitions=None, processes=None, chunk_size=8388608):
+        """
+        Get the dataset's data, decoded in parallel by a pool of processes. This is much faster than
+        iter_rows on very large datasets, when several cores are available
+
+        Args:
+            partitions: (optional) the partitions to read
+            processes: the number of decoding processes. Defaults to the number of cores
+            chunk_size: the approximate size in bytes of the data decoded at once, and thus of each batch
+
+        Return:
+            an iterator over :class:`dataikuapi.utils.DataikuColumnBatch`, in the order of the data. Each batch
+            holds the values of its rows by column, in the order of columns in the schema returned by get_schema
+        """
+        csv_stream = self.client._perform_raw(
+                "GET" , "/projects/%s/datasets/%s/data/" %(self.project_key, self.dataset_name),
+                params = {
+                    "format" : "tsv-excel-noheader",
+                    "partitions" : partitions
+                })
+
+        return DataikuStreamedHttpUTF8CSVReader(self.get_schema()["columns"], csv_stream).iter_column_batches(processes=processes, chunk_size=chunk_size)
+
+    def download_to_file(self, path, format="tsv-excel-header", partitions=None, compression=None, checksum=True, buffer_size=1048576):
+        """
+        Download the dataset's data to a local file, as it is streamed by DSS, without decoding the rows
+
+        Args:
+            path: the path of the file to write
+            format: the format in which DSS streams the data, for example "tsv-excel-header", "csv-excel-header" or "parquet"
+            partitions: (optional) the partitions to download
+            compression: (optional) "gzip" to compress the file on the fly
+            checksum: whether to compute the SHA-256 of the file
+            buffer_size: the size in bytes of the reads and writes
+
+        Returns:
+            a dict with the number of bytes read ("bytesRead") and written ("bytesWritten"), and the hex SHA-256 of the file ("sha256")
+        """
+        stream = self.client._perform_raw(
+                "GET" , "/projects/%s/datasets/%s/data/" %(self.project_key, self.dataset_name),
+                params = {
+                    "format" : format,
+                    "partitions" : partitions
+                })
+        with closing(stream) as r:
+            r.raw.decode_content = True
+            with open(path, "wb") as f:
+                return dku_copy_stream_to_file(r.raw, f, buffer_size=buffer_size, compression=compression, checksum=checksum)
 
 
     def list_partitions(self):
@@ -228,7 +285,23 @@ class DSSDataset(object):
         """
         return self.client._perform_json(
                 "GET", "/projects/%s/datasets/%s/metrics/history/%s" % (self.project_key, self.dataset_name, 'NP' if len(partition) == 0 else partition),
-                params={'metricLookup' : metric if isinstance(metric, str) or isinstance(metric, unicode) else json.dumps(metric)})
+                params={'metricLookup' : metric if isinstance(metric, dku_basestring_type) else json.dumps(metric)})
+
+    def get_metric_histories(self, metrics, partitions=None, parallelism=8):
+        """
+        Get the histories of many metrics on many partitions of this dataset, fetched concurrently
+
+        Args:
+            metrics: the ids of the metrics
+            partitions: (optional) the partitions. If None, the histories on the whole dataset
+            parallelism: the maximum number of concurrent calls
+
+        Returns:
+            a dict of (metric id, partition) to :class:`dataikuapi.dss.metrics.DSSMetricTimeSeries`. The partition is ''
+            for the whole dataset
+        """
+        keys = [(metric, partition) for metric in metrics for partition in (partitions if partitions is not None else [''])]
+        return fetch_metric_histories(self.client, lambda key: self.get_metric_history(key[0], partition=key[1]), keys, parallelism=parallelism)
 
     ########################################################
     # Usages
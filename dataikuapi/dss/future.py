@@ -1,4 +1,5 @@
 import sys, time
+from ..tracing import dku_trace_span
 
 class DSSFuture(object):
     """
@@ -57,13 +58,20 @@ class DSSFuture(object):
         """
         Wait and get the future result
         """
-        if self.state is None or not self.state.get('hasResult', False) or self.state_is_peek:
-            self.get_state()
-        while not self.state.get('hasResult', False):
-            time.sleep(5)
-            self.get_state()
-        if self.state.get('hasResult', False):
-            return self.state.get('result', None)
-        else:
-            raise Exception("No result")
+        with dku_trace_span(self.client, "dss.future.wait_for_result", {"dss.job_id" : self.job_id}) as span:
+            poll_count = 0
+            try:
+                if self.state is None or not self.state.get('hasResult', False) or self.state_is_peek:
+                    poll_count += 1
+                    self.get_state()
+                while not self.state.get('hasResult', False):
+                    time.sleep(5)
+                    poll_count += 1
+                    self.get_state()
+            finally:
+                span.set_attribute("dss.poll_count", poll_count)
+            if self.state.get('hasResult', False):
+                return self.state.get('result', None)
+            else:
+                raise Exception("No result")
 
@@ -0,0 +1,200 @@
+import json
+import sqlite3
+import time
+from ..utils import DataikuRateLimiter, dku_parallel_imap
+
+class DSSProjectsInventoryCrawler(object):
+    """
+    Crawls the datasets, recipes, scenarios, saved models and metadata of many projects, fanning
+    the calls out over a bounded pool of workers.
+
+    To simply crawl all projects into a sink, use :meth:`dataikuapi.DSSClient.crawl_projects_inventory`
+
+    :param client: the :class:`dataikuapi.DSSClient` to crawl with
+    :param int parallelism: the maximum number of concurrent calls
+    :param float max_requests_per_second: (optional) the maximum number of calls started per second on the DSS host
+    :param int retries: the number of times a failed call is retried
+    :param bool compact: if True, only a few fields of each dataset, recipe, scenario and saved model are kept
+    """
+
+    # the fields kept on each item of a compact inventory record
+    COMPACT_FIELDS = {
+        "datasets" : ["name", "type", "managed", "tags"],
+        "recipes" : ["name", "type", "tags"],
+        "scenarios" : ["id", "name", "active", "tags"],
+        "savedModels" : ["id", "name", "type", "tags"]
+    }
+
+    def __init__(self, client, parallelism=8, max_requests_per_second=None, retries=1, compact=True):
+        self.client = client
+        self.parallelism = parallelism
+        self.rate_limiter = DataikuRateLimiter(max_requests_per_second)
+        self.retries = retries
+        self.compact = compact
+
+    def _fetch(self, task):
+        (project_key, kind) = task
+        project = self.client.get_project(project_key)
+        if kind == "datasets":
+            return project.list_datasets()
+        elif kind == "recipes":
+            return project.list_recipes()
+        elif kind == "scenarios":
+            return project.list_scenarios()
+        elif kind == "savedModels":
+            return project.list_saved_models()
+        else:
+            return project.get_metadata()
+
+    def _compact_items(self, kind, items):
+        fields = DSSProjectsInventoryCrawler.COMPACT_FIELDS[kind]
+        return [dict((f, item[f]) for f in fields if f in item) for item in items]
+
+    def crawl(self, project_keys=None, previous=None):
+        """
+        Crawls the projects, and yields an inventory record for each project as soon as all its calls completed.
+        Records are not yielded in any particular order.
+
+        Each record is a dict with the fields "projectKey", "versionTag", "crawlTime", "metadata", "datasets",
+        "recipes", "scenarios", "savedModels" and "errors" (a dict of the calls that failed, and their error message)
+
+        :param list project_keys: (optional) the keys of the projects to crawl. If None, all projects are crawled
+        :param previous: (optional) a :class:`DSSInventoryIndex` from a previous crawl. The record of a project
+                         whose version tag did not change since then is yielded again without any call to DSS
+        :returns: a generator over the inventory records, as dicts
+        """
+        projects = self.client.list_projects()
+        if project_keys is not None:
+            wanted = set(project_keys)
+            projects = [p for p in projects if p["projectKey"] in wanted]
+
+        version_tags = {}
+        tasks = []
+        for p in projects:
+            project_key = p["projectKey"]
+            version_tag = p.get("versionTag", None)
+            if previous is not None and version_tag is not None:
+                previous_record = previous.get(project_key)
+                if previous_record is not None and previous_record.get("versionTag", None) == version_tag and len(previous_record.get("errors", {})) == 0:
+                    yield previous_record
+                    continue
+            version_tags[project_key] = version_tag
+            for kind in ["metadata", "datasets", "recipes", "scenarios", "savedModels"]:
+                tasks.append((project_key, kind))
+
+        self.client._ensure_connection_pool_size(self.parallelism)
+        pending = {}
+        for (task, result, error) in dku_parallel_imap(self._fetch, tasks, parallelism=self.parallelism,
+                                                       retries=self.retries, rate_limiter=self.rate_limiter):
+            (project_key, kind) = task
+            record = pending.get(project_key, None)
+            if record is None:
+                record = {"projectKey" : project_key, "versionTag" : version_tags[project_key], "errors" : {}, "remaining" : 5}
+                pending[project_key] = record
+            if error is not None:
+                record[kind] = None
+                record["errors"][kind] = str(error)
+            elif self.compact and kind != "metadata":
+                record[kind] = self._compact_items(kind, result)
+            else:
+                record[kind] = result
+            record["remaining"] -= 1
+            if record["remaining"] == 0:
+                del pending[project_key]
+                del record["remaining"]
+                record["crawlTime"] = int(time.time() * 1000)
+                yield record
+
+
+class DSSInventoryIndex(object):
+    """
+    A compact in-memory index of project inventory records, by project key
+    """
+    def __init__(self, records=None):
+        self.records = {}
+        if records is not None:
+            for record in records:
+                self.add(record)
+
+    def add(self, record):
+        """Adds or replaces the inventory record of a project"""
+        self.records[record["projectKey"]] = record
+
+    def get(self, project_key):
+        """Gets the inventory record of a project, or None if it was not crawled"""
+        return self.records.get(project_key, None)
+
+    def list_project_keys(self):
+        """Lists the keys of the crawled projects"""
+        return list(self.records.keys())
+
+    def find_items(self, kind, name):
+        """
+        Finds the items of a given kind with a given name across all crawled projects
+
+        :param str kind: one of "datasets", "recipes", "scenarios" or "savedModels"
+        :param str name: the name of the items
+        :returns: a list of (project key, item) pairs
+        """
+        found = []
+        for (project_key, record) in self.records.items():
+            for item in record.get(kind, None) or []:
+                if item.get("name", None) == name:
+                    found.append((project_key, item))
+        return found
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def from_jsonl(path):
+        """Loads an index from a JSONL file written by a :class:`DSSInventoryJSONLSink`"""
+        index = DSSInventoryIndex()
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    index.add(json.loads(line))
+        return index
+
+
+class DSSInventoryJSONLSink(object):
+    """
+    Writes project inventory records to a file, one JSON record per line
+    """
+    def __init__(self, path):
+        self.f = open(path, "w")
+
+    def add(self, record):
+        self.f.write(json.dumps(record))
+        self.f.write("\n")
+
+    def close(self):
+        self.f.close()
+
+
+class DSSInventorySQLiteSink(object):
+    """
+    Stores project inventory records in a SQLite database, one row per project.
+    Records of projects already in the database are replaced
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS project_inventory (project_key TEXT PRIMARY KEY, version_tag TEXT, crawl_time INTEGER, record TEXT)")
+        self.uncommitted = 0
+
+    def add(self, record):
+        self.connection.execute("INSERT OR REPLACE INTO project_inventory VALUES (?, ?, ?, ?)",
+                                (record["projectKey"], json.dumps(record.get("versionTag", None)), record.get("crawlTime", None), json.dumps(record)))
+        self.uncommitted += 1
+        if self.uncommitted >= 100:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def load_index(self):
+        """Loads the stored records as a :class:`DSSInventoryIndex`"""
+        self.connection.commit()
+        return DSSInventoryIndex([json.loads(row[0]) for row in self.connection.execute("SELECT record FROM project_inventory")])
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
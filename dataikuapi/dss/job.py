@@ -50,14 +50,17 @@ class DSSJobWaiter(object):
     """    
     def __init__(self, job):
         self.job = job
+        self.poll_count = 0
 
     def wait(self, no_fail=False):
         job_state = self.job.get_status().get("baseStatus", {}).get("state", "")
+        self.poll_count += 1
         sleep_time = 2
         while job_state not in ["DONE", "ABORTED", "FAILED"]:
             sleep_time = 300 if sleep_time >= 300 else sleep_time * 2
             time.sleep(sleep_time)
             job_state = self.job.get_status().get("baseStatus", {}).get("state", "")
+            self.poll_count += 1
             if job_state in ["ABORTED", "FAILED"]:
                 if no_fail:
                     break
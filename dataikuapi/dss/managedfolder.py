@@ -1,8 +1,12 @@
 from ..utils import DataikuException
 from ..utils import DataikuUTF8CSVReader
 from ..utils import DataikuStreamedHttpUTF8CSVReader
+from ..utils import DataikuMultipartFileStream, dku_parallel_imap, dku_basestring_type
+import hashlib
 import json
-from .metrics import ComputedMetrics
+import os
+import os.path as osp
+from .metrics import ComputedMetrics, fetch_metric_histories
 from .discussion import DSSObjectDiscussions
 
 class DSSManagedFolder(object):
@@ -98,6 +102,272 @@ class DSSManagedFolder(object):
                 "POST", "/projects/%s/managedfolders/%s/contents/" % (self.project_key, self.odb_id),
                 name, f)
 
+    def upload_file(self, path, local_path):
+        """
+        Upload a local file to the managed folder. The file is streamed as it is sent, and never loaded in memory
+        
+        Args:
+            path: the path of the file in the managed folder
+            local_path: the path of the local file
+        """
+        with open(local_path, "rb") as f:
+            body = DataikuMultipartFileStream(path, f, osp.getsize(local_path))
+            return self.client._perform_empty(
+                    "POST", "/projects/%s/managedfolders/%s/contents/" % (self.project_key, self.odb_id),
+                    raw_body=body, headers={"Content-Type" : body.content_type})
+
+    def download_file(self, path, local_path, buffer_size=1048576):
+        """
+        Download a file of the managed folder to a local file. The file is first written next to the local path,
+        with a ".part" suffix, and only renamed once complete
+        
+        Args:
+            path: the path of the file in the managed folder
+            local_path: the path of the local file
+            buffer_size: the size in bytes of the reads and writes
+
+        Returns:
+            a dict with the size of the file ("bytesWritten") and its hex SHA-256 ("sha256")
+        """
+        with open(local_path + ".part", "wb") as f:
+            result = self.client._download_to_file(
+                    "GET", "/projects/%s/managedfolders/%s/contents/%s" % (self.project_key, self.odb_id, path), f,
+                    buffer_size=buffer_size, retries=0)
+        if osp.exists(local_path):
+            os.remove(local_path)
+        os.rename(local_path + ".part", local_path)
+        return result
+
+    def upload_directory(self, local_dir, parallelism=4, retries=2, skip_existing=True):
+        """
+        Upload all the files of a local directory (recursively) to the managed folder, concurrently. Each file is
+        streamed as it is sent, and a failed upload is retried without uploading the other files again
+        
+        Args:
+            local_dir: the local directory. Files keep their path relative to it in the managed folder
+            parallelism: the maximum number of concurrent uploads
+            retries: the number of times a failed upload is retried
+            skip_existing: whether to skip the files that are already in the managed folder with the same size,
+                for example to complete an interrupted upload
+
+        Returns:
+            a dict with the paths of the uploaded ("transferred") and skipped ("skipped") files, and a dict of the
+            paths of the files that could not be uploaded to their error ("failed")
+        """
+        local_files = _list_local_files(local_dir)
+        remote_items = self._list_items_by_path() if skip_existing else {}
+
+        def is_same(path):
+            remote_item = remote_items.get(path, None)
+            return remote_item is not None and remote_item.get("size", None) == osp.getsize(local_files[path])
+
+        return self._transfer(sorted(local_files.keys()), is_same,
+                              lambda path: self.upload_file(path, local_files[path]),
+                              parallelism, retries)
+
+    def download_all(self, local_dir, parallelism=4, retries=2, skip_existing=True):
+        """
+        Download all the files of the managed folder to a local directory, concurrently. Each file is streamed to disk,
+        and a failed download is retried without downloading the other files again
+        
+        Args:
+            local_dir: the local directory. Files keep their path in the managed folder relative to it
+            parallelism: the maximum number of concurrent downloads
+            retries: the number of times a failed download is retried
+            skip_existing: whether to skip the files that are already in the local directory with the same size,
+                for example to complete an interrupted download
+
+        Returns:
+            a dict with the paths of the downloaded ("transferred") and skipped ("skipped") files, and a dict of the
+            paths of the files that could not be downloaded to their error ("failed")
+        """
+        remote_items = self._list_items_by_path()
+
+        def is_same(path):
+            local_path = osp.join(local_dir, *path.split("/"))
+            return skip_existing and osp.isfile(local_path) and osp.getsize(local_path) == remote_items[path].get("size", None)
+
+        return self._transfer(sorted(remote_items.keys()), is_same,
+                              lambda path: self._download_into(local_dir, path),
+                              parallelism, retries)
+
+    def sync_from_local(self, local_dir, compare="mtime", delete=False, parallelism=4, retries=2, manifest_path=None):
+        """
+        Make the managed folder identical to a local directory, by only uploading the files that differ, like rsync.
+
+        Files of different sizes always differ. Files of the same size are compared according to ``compare``:
+
+        * "size": they are the same
+        * "mtime": they are the same if neither changed since the last sync, or else if the local file is older than the remote one
+        * "hash": they are the same if the remote file did not change since the last sync, and the SHA-256 of the local
+          file is the one recorded then
+
+        The state of the last sync (sizes, modification times and hashes) is kept in a local manifest.
+
+        Args:
+            local_dir: the local directory. Files keep their path relative to it in the managed folder
+            compare: how to compare files of the same size: "size", "mtime" or "hash"
+            delete: whether to delete the files of the managed folder that are not in the local directory
+            parallelism: the maximum number of concurrent uploads
+            retries: the number of times a failed upload is retried
+            manifest_path: (optional) the path of the manifest file. Defaults to ".dss-sync-manifest.json" in the local directory,
+                which is not synced
+
+        Returns:
+            a dict with the paths of the uploaded ("transferred"), skipped ("skipped") and deleted ("deleted") files, and a dict
+            of the paths of the files that could not be uploaded to their error ("failed")
+        """
+        manifest_path = manifest_path if manifest_path is not None else osp.join(local_dir, _SYNC_MANIFEST_NAME)
+        manifest = _load_sync_manifest(manifest_path)
+        local_files = _list_local_files(local_dir, exclude=manifest_path)
+        remote_items = self._list_items_by_path()
+        hashes = {}
+
+        def is_same(path):
+            local_path = local_files[path]
+            remote_item = remote_items.get(path, None)
+            if remote_item is None or remote_item.get("size", None) != osp.getsize(local_path):
+                return False
+            entry = manifest.get(path, None)
+            unchanged_remote = entry is not None and entry.get("remoteLastModified", None) == remote_item.get("lastModified", None)
+            if compare == "size":
+                return True
+            elif compare == "mtime":
+                local_mtime = _get_mtime_ms(local_path)
+                if unchanged_remote and entry.get("localMtime", None) == local_mtime:
+                    return True
+                return local_mtime <= remote_item.get("lastModified", 0)
+            else:
+                hashes[path] = _get_file_sha256(local_path, manifest.get(path, None))
+                return unchanged_remote and entry.get("sha256", None) == hashes[path]
+
+        summary = self._transfer(sorted(local_files.keys()), is_same,
+                                 lambda path: self.upload_file(path, local_files[path]),
+                                 parallelism, retries)
+        summary["deleted"] = []
+        if delete:
+            for path in sorted(remote_items.keys()):
+                if path not in local_files:
+                    self.delete_file(path)
+                    summary["deleted"].append(path)
+
+        # record the state of the synced files, with their new remote modification times
+        remote_items = self._list_items_by_path()
+        new_manifest = {}
+        for path in summary["transferred"] + summary["skipped"]:
+            local_path = local_files[path]
+            remote_last_modified = remote_items.get(path, {}).get("lastModified", None)
+            sha256 = hashes.get(path, None) or _get_known_sha256(local_path, manifest.get(path, None), remote_last_modified)
+            if sha256 is None and compare == "hash":
+                sha256 = _get_file_sha256(local_path)
+            new_manifest[path] = {"size" : osp.getsize(local_path), "localMtime" : _get_mtime_ms(local_path), "sha256" : sha256,
+                                  "remoteLastModified" : remote_last_modified}
+        _save_sync_manifest(manifest_path, new_manifest)
+        return summary
+
+    def sync_to_local(self, local_dir, compare="mtime", delete=False, parallelism=4, retries=2, manifest_path=None):
+        """
+        Make a local directory identical to the managed folder, by only downloading the files that differ, like rsync.
+
+        Files of different sizes always differ. Files of the same size are compared according to ``compare``:
+
+        * "size": they are the same
+        * "mtime": they are the same if neither changed since the last sync, or else if the local file is newer than the remote one
+        * "hash": they are the same if the remote file did not change since the last sync, and the SHA-256 of the local
+          file is the one recorded then
+
+        The state of the last sync (sizes, modification times and hashes) is kept in a local manifest.
+
+        Args:
+            local_dir: the local directory. Files keep their path in the managed folder relative to it
+            compare: how to compare files of the same size: "size", "mtime" or "hash"
+            delete: whether to delete the local files that are not in the managed folder
+            parallelism: the maximum number of concurrent downloads
+            retries: the number of times a failed download is retried
+            manifest_path: (optional) the path of the manifest file. Defaults to ".dss-sync-manifest.json" in the local directory,
+                which is not synced
+
+        Returns:
+            a dict with the paths of the downloaded ("transferred"), skipped ("skipped") and deleted ("deleted") files, and a dict
+            of the paths of the files that could not be downloaded to their error ("failed")
+        """
+        manifest_path = manifest_path if manifest_path is not None else osp.join(local_dir, _SYNC_MANIFEST_NAME)
+        manifest = _load_sync_manifest(manifest_path)
+        local_files = _list_local_files(local_dir, exclude=manifest_path) if osp.isdir(local_dir) else {}
+        remote_items = self._list_items_by_path()
+        hashes = {}
+
+        def is_same(path):
+            local_path = local_files.get(path, None)
+            remote_item = remote_items[path]
+            if local_path is None or remote_item.get("size", None) != osp.getsize(local_path):
+                return False
+            entry = manifest.get(path, None)
+            unchanged_remote = entry is not None and entry.get("remoteLastModified", None) == remote_item.get("lastModified", None)
+            if compare == "size":
+                return True
+            elif compare == "mtime":
+                local_mtime = _get_mtime_ms(local_path)
+                if unchanged_remote and entry.get("localMtime", None) == local_mtime:
+                    return True
+                return local_mtime >= remote_item.get("lastModified", 0)
+            else:
+                hashes[path] = _get_file_sha256(local_path, manifest.get(path, None))
+                return unchanged_remote and entry.get("sha256", None) == hashes[path]
+
+        downloaded = {}
+        def download(path):
+            downloaded[path] = self._download_into(local_dir, path)["sha256"]
+
+        summary = self._transfer(sorted(remote_items.keys()), is_same, download, parallelism, retries)
+        summary["deleted"] = []
+        if delete:
+            for path in sorted(local_files.keys()):
+                if path not in remote_items:
+                    os.remove(local_files[path])
+                    summary["deleted"].append(path)
+
+        new_manifest = {}
+        for path in summary["transferred"] + summary["skipped"]:
+            local_path = osp.join(local_dir, *path.split("/"))
+            remote_last_modified = remote_items[path].get("lastModified", None)
+            sha256 = downloaded.get(path, None) or hashes.get(path, None) \
+                        or _get_known_sha256(local_path, manifest.get(path, None), remote_last_modified)
+            if sha256 is None and compare == "hash":
+                sha256 = _get_file_sha256(local_path)
+            new_manifest[path] = {"size" : osp.getsize(local_path), "localMtime" : _get_mtime_ms(local_path), "sha256" : sha256,
+                                  "remoteLastModified" : remote_last_modified}
+        _save_sync_manifest(manifest_path, new_manifest)
+        return summary
+
+    def _list_items_by_path(self):
+        return dict((item["path"].lstrip("/"), item) for item in self.list_contents().get("items", []))
+
+    def _download_into(self, local_dir, path):
+        local_path = osp.join(local_dir, *path.split("/"))
+        try:
+            os.makedirs(osp.dirname(local_path))
+        except OSError:
+            if not osp.isdir(osp.dirname(local_path)):
+                raise
+        return self.download_file(path, local_path)
+
+    def _transfer(self, paths, is_same, transfer, parallelism, retries):
+        summary = {"transferred" : [], "skipped" : [], "failed" : {}}
+        todo = []
+        for path in paths:
+            if is_same(path):
+                summary["skipped"].append(path)
+            else:
+                todo.append(path)
+        self.client._ensure_connection_pool_size(parallelism)
+        for (path, result, error) in dku_parallel_imap(transfer, todo, parallelism=parallelism, retries=retries):
+            if error is not None:
+                summary["failed"][path] = str(error)
+            else:
+                summary["transferred"].append(path)
+        return summary
+
     ########################################################
     # Managed folder actions
     ########################################################
@@ -145,7 +415,22 @@ class DSSManagedFolder(object):
         """
         return self.client._perform_json(
                 "GET", "/projects/%s/managedfolders/%s/metrics/history" % (self.project_key, self.odb_id),
-                params={'metricLookup' : metric if isinstance(metric, str) or isinstance(metric, unicode) else json.dumps(metric)})
+                params={'metricLookup' : metric if isinstance(metric, dku_basestring_type) else json.dumps(metric)})
+
+    def get_metric_histories(self, metrics, parallelism=8):
+        """
+        Get the histories of many metrics on this managed folder, fetched concurrently
+
+        Args:
+            metrics: the ids of the metrics
+            parallelism: the maximum number of concurrent calls
+
+        Returns:
+            a dict of metric id to :class:`dataikuapi.dss.metrics.DSSMetricTimeSeries`
+        """
+        series = fetch_metric_histories(self.client, lambda key: self.get_metric_history(key[0]),
+                                        [(metric, '') for metric in metrics], parallelism=parallelism)
+        return dict((key[0], s) for (key, s) in series.items())
 
 
                 
@@ -173,3 +458,54 @@ class DSSManagedFolder(object):
         :rtype: :class:`dataikuapi.discussion.DSSObjectDiscussions`
         """
         return DSSObjectDiscussions(self.client, self.project_key, "MANAGED_FOLDER", self.odb_id)
+
+
+_SYNC_MANIFEST_NAME = ".dss-sync-manifest.json"
+
+def _list_local_files(local_dir, exclude=None):
+    """Lists the files of a local directory, recursively, as a dict of their path relative to it (with "/" separators) to their path"""
+    local_files = {}
+    for (root, dirs, files) in os.walk(local_dir):
+        for name in files:
+            local_path = osp.join(root, name)
+            if exclude is not None and osp.abspath(local_path) == osp.abspath(exclude):
+                continue
+            local_files[osp.relpath(local_path, local_dir).replace(os.sep, "/")] = local_path
+    return local_files
+
+def _get_mtime_ms(local_path):
+    return int(osp.getmtime(local_path) * 1000)
+
+def _get_known_sha256(local_path, entry, remote_last_modified):
+    """Gets the SHA-256 recorded in a manifest entry, if neither the local file nor the remote file changed since, or None"""
+    if entry is not None and entry.get("remoteLastModified", None) == remote_last_modified:
+        return _get_file_sha256(local_path, entry, compute=False)
+    return None
+
+def _get_file_sha256(local_path, entry=None, compute=True):
+    """Computes the SHA-256 of a local file, unless the manifest entry shows it did not change since it was last computed"""
+    if entry is not None and entry.get("sha256", None) is not None and entry.get("size", None) == osp.getsize(local_path) \
+            and entry.get("localMtime", None) == _get_mtime_ms(local_path):
+        return entry["sha256"]
+    if not compute:
+        return None
+    sha = hashlib.sha256()
+    with open(local_path, "rb") as f:
+        while True:
+            data = f.read(1048576)
+            if not data:
+                break
+            sha.update(data)
+    return sha.hexdigest()
+
+def _load_sync_manifest(manifest_path):
+    if not osp.isfile(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f).get("files", {})
+
+def _save_sync_manifest(manifest_path, files):
+    if not osp.isdir(osp.dirname(osp.abspath(manifest_path))):
+        os.makedirs(osp.dirname(osp.abspath(manifest_path)))
+    with open(manifest_path, "w") as f:
+        json.dump({"files" : files}, f, indent=2, sort_keys=True)
@@ -1,30 +1,46 @@
-
+import time
+from ..utils import DataikuException, dku_import_numpy, dku_parallel_imap
 
 class ComputedMetrics(object):
     def __init__(self, raw):
         self.raw = raw
+        # index the metrics by id, and their last values by partition. The first occurrence wins, as in a scan
+        self._metrics = {}
+        self._partitions = {}
+        self._global_data = {}
+        for metric in self.raw["metrics"]:
+            id = metric["metric"]["id"]
+            if id in self._metrics:
+                continue
+            self._metrics[id] = metric
+            partitions = {}
+            for partition_data in metric["lastValues"]:
+                partition = partition_data["partition"]
+                if partition not in partitions:
+                    partitions[partition] = partition_data
+                if id not in self._global_data and (partition == "NP" or partition == "ALL"):
+                    self._global_data[id] = partition_data
+            self._partitions[id] = partitions
 
     def get_metric_by_id(self, id):
-        all_ids = []
-        for metric in self.raw["metrics"]:
-            all_ids.append(metric["metric"]["id"])
-            if metric["metric"]["id"] == id:
-                return metric
-        raise Exception("Metric %s not found among: %s" % (id, all_ids))
+        metric = self._metrics.get(id, None)
+        if metric is None:
+            raise Exception("Metric %s not found among: %s" % (id, self.get_all_ids()))
+        return metric
 
     def get_global_data(self, metric_id):
-        for partition_data in self.get_metric_by_id(metric_id)["lastValues"]:
-            if partition_data["partition"]== "NP" or partition_data["partition"] == "ALL":
-                return partition_data
-        raise Exception("No data found for global partition for metric %s" % metric_id)
+        self.get_metric_by_id(metric_id)
+        partition_data = self._global_data.get(metric_id, None)
+        if partition_data is None:
+            raise Exception("No data found for global partition for metric %s" % metric_id)
+        return partition_data
 
     def get_global_value(self, metric_id):
         return ComputedMetrics.get_value_from_data(self.get_global_data(metric_id))
 
     def get_partition_data(self, metric_id, partition):
-        for partition_data in self.get_metric_by_id(metric_id)["lastValues"]:
-            if partition_data["partition"] == partition:
-                return partition_data
+        self.get_metric_by_id(metric_id)
+        return self._partitions[metric_id].get(partition, None)
 
     def get_partition_value(self, metric_id, partition):
         return ComputedMetrics.get_value_from_data(self.get_partition_data(metric_id, partition))
@@ -40,6 +56,47 @@ class ComputedMetrics(object):
             all_ids.append(metric["metric"]["id"])
         return all_ids
 
+    def get_partitions(self, metric_id):
+        """Gets the partitions for which the metric has a value"""
+        self.get_metric_by_id(metric_id)
+        return list(self._partitions[metric_id].keys())
+
+    def get_partition_values(self, metric_id, partitions=None):
+        """
+        Gets the values of a metric across partitions, as a typed NumPy array (requires numpy): int64 for integer metrics,
+        float64 for floating point metrics, objects otherwise
+
+        :param list partitions: (optional) the partitions, in the order of the values. If None, all the partitions of the metric
+        :returns: a tuple of the list of partitions and the array of values. The value for a partition without data is None,
+                  or NaN for floating point metrics
+        """
+        self.get_metric_by_id(metric_id)
+        by_partition = self._partitions[metric_id]
+        if partitions is None:
+            partitions = list(by_partition.keys())
+        data = [by_partition.get(partition, None) for partition in partitions]
+        return (partitions, ComputedMetrics.get_values_from_data(data))
+
+    @staticmethod
+    def get_values_from_data(data):
+        """
+        Casts the values of several metric data in bulk, into a typed NumPy array (requires numpy). The type is
+        the data type of the first data. Missing data (None) are None, or NaN for floating point values
+        """
+        np = dku_import_numpy()
+        first = next((d for d in data if d is not None), None)
+        dtype = first.get("dataType", "STRING") if first is not None else "STRING"
+        try:
+            if dtype in ["BIGINT", "INT"]:
+                if all(d is not None for d in data):
+                    return np.array([d["value"] for d in data], dtype=np.int64)
+            elif dtype in ["FLOAT", "DOUBLE"]:
+                return np.array([d["value"] if d is not None else np.nan for d in data], dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+        values = np.empty(len(data), dtype=object)
+        values[:] = [ComputedMetrics.get_value_from_data(d) if d is not None else None for d in data]
+        return values
 
     @staticmethod
     def get_value_from_data(data):
@@ -49,4 +106,289 @@ class ComputedMetrics(object):
         elif dtype in ["FLOAT", "DOUBLE"]:
             return float(data["value"])
         else:
-            return data["value"]
\ No newline at end of file
+            return data["value"]
+
+
+class DSSMetricTimeSeries(object):
+    """
+    The history of the values of a metric, as a compact time series (requires numpy): ``times`` is an int64 array of
+    timestamps in milliseconds, in increasing order, and ``values`` a float64 array for numerical metrics, an object
+    array otherwise.
+
+    Do not create this object directly, use :meth:`dataikuapi.dss.dataset.DSSDataset.get_metric_histories` or
+    :meth:`dataikuapi.dss.managedfolder.DSSManagedFolder.get_metric_histories`
+    """
+
+    def __init__(self, metric_id, partition, times, values):
+        self.metric_id = metric_id
+        self.partition = partition
+        self.times = times
+        self.values = values
+
+    @staticmethod
+    def from_history(metric_id, partition, history):
+        """Builds a time series from the history of a metric, as returned by get_metric_history"""
+        np = dku_import_numpy()
+        points = sorted(history.get("values", []), key=lambda p: p["time"])
+        times = np.array([p["time"] for p in points], dtype=np.int64)
+        dtype = history.get("valueType", None) or (history.get("lastValue", None) or {}).get("dataType", "STRING")
+        values = None
+        if dtype in ["BIGINT", "INT", "FLOAT", "DOUBLE"]:
+            try:
+                values = np.array([p["value"] if p["value"] is not None else np.nan for p in points], dtype=np.float64)
+            except (TypeError, ValueError):
+                pass
+        if values is None:
+            values = np.empty(len(points), dtype=object)
+            values[:] = [p["value"] for p in points]
+        return DSSMetricTimeSeries(metric_id, partition, times, values)
+
+    def __len__(self):
+        return len(self.times)
+
+    def is_numerical(self):
+        return self.values.dtype != object
+
+    def downsample(self, interval, how="last"):
+        """
+        Aggregates the values by time bucket, for example to get one value per day
+
+        :param int interval: the size of the buckets, in milliseconds. Buckets are aligned on the epoch
+        :param str how: the aggregation: "first", "last", "min", "max", "sum", "mean" or "count". Only "first",
+                        "last" and "count" apply to non-numerical metrics
+        :returns: a new time series, with one point per non-empty bucket, at the start of the bucket
+        """
+        np = dku_import_numpy()
+        buckets = (self.times // interval) * interval
+        (starts, first_indices) = np.unique(buckets, return_index=True)
+        return DSSMetricTimeSeries(self.metric_id, self.partition, starts,
+                                   self._reduce(first_indices, how))
+
+    def rolling(self, window, how="mean"):
+        """
+        Aggregates the values over a sliding window of points
+
+        :param int window: the number of points in the window, ending at each point
+        :param str how: the aggregation: "min", "max", "sum", "mean" or "count"
+        :returns: a new time series, with one point for each point from the window-th one on. The value of a window
+                  containing a missing (NaN) value is missing
+        """
+        np = dku_import_numpy()
+        if window <= 0 or window > len(self):
+            return DSSMetricTimeSeries(self.metric_id, self.partition, self.times[:0], self.values[:0])
+        times = self.times[window - 1:]
+        if how == "count":
+            return DSSMetricTimeSeries(self.metric_id, self.partition, times, np.full(len(times), window, dtype=np.int64))
+        self._check_numerical(how)
+        if how in ["sum", "mean"]:
+            # a missing value only makes the windows containing it missing, instead of all the windows after it
+            cumsum = np.concatenate([[0.0], np.cumsum(np.where(np.isnan(self.values), 0.0, self.values))])
+            nans = np.concatenate([[0], np.cumsum(np.isnan(self.values))])
+            sums = np.where(nans[window:] - nans[:-window] > 0, np.nan, cumsum[window:] - cumsum[:-window])
+            return DSSMetricTimeSeries(self.metric_id, self.partition, times, sums / window if how == "mean" else sums)
+        elif how in ["min", "max"]:
+            windows = np.lib.stride_tricks.as_strided(self.values, shape=(len(times), window),
+                                                      strides=(self.values.strides[0], self.values.strides[0]))
+            return DSSMetricTimeSeries(self.metric_id, self.partition, times, windows.min(axis=1) if how == "min" else windows.max(axis=1))
+        raise ValueError("Unsupported aggregation: %s" % how)
+
+    def _reduce(self, first_indices, how):
+        np = dku_import_numpy()
+        if how not in ["first", "last", "count", "min", "max", "sum", "mean"]:
+            raise ValueError("Unsupported aggregation: %s" % how)
+        if how not in ["first", "last", "count"]:
+            self._check_numerical(how)
+        if len(first_indices) == 0:
+            return np.zeros(0, dtype=np.int64) if how == "count" else self.values[:0]
+        last_indices = np.concatenate([first_indices[1:], [len(self.values)]]) - 1
+        if how == "first":
+            return self.values[first_indices]
+        elif how == "last":
+            return self.values[last_indices]
+        elif how == "count":
+            return (last_indices - first_indices + 1).astype(np.int64)
+        elif how == "min":
+            return np.minimum.reduceat(self.values, first_indices)
+        elif how == "max":
+            return np.maximum.reduceat(self.values, first_indices)
+        elif how == "sum":
+            return np.add.reduceat(self.values, first_indices)
+        else:
+            return np.add.reduceat(self.values, first_indices) / (last_indices - first_indices + 1)
+
+    def _check_numerical(self, how):
+        if not self.is_numerical():
+            raise ValueError("Aggregation %s requires a numerical metric, %s is not" % (how, self.metric_id))
+
+
+def fetch_metric_histories(client, fetch, keys, parallelism=8):
+    """
+    Fetches the histories of many metrics concurrently, and returns them as a dict of key to :class:`DSSMetricTimeSeries`
+
+    :param fetch: a function taking a (metric id, partition) key and returning the raw history
+    :param list keys: the (metric id, partition) keys
+    """
+    client._ensure_connection_pool_size(parallelism)
+    series = {}
+    for (key, history, error) in dku_parallel_imap(fetch, keys, parallelism=parallelism):
+        if error is not None:
+            raise error
+        series[key] = DSSMetricTimeSeries.from_history(key[0], key[1], history)
+    return series
+
+
+class DSSMetricsChecksRunner(object):
+    """
+    Computes the metrics and runs the checks of many datasets and partitions, on a bounded pool of workers. For each
+    dataset and partition, the checks run once the metrics are computed, so that they see the new values
+
+    :param int parallelism: the maximum number of datasets and partitions processed at once
+    :param int retries: the number of times a failed action is retried
+    :param bool compute_metrics: whether to compute the metrics setup on the datasets
+    :param bool run_checks: whether to run the checks setup on the datasets
+    :param float retry_delay: the number of seconds to wait before retrying a failed action
+    """
+    def __init__(self, parallelism=8, retries=1, compute_metrics=True, run_checks=True, retry_delay=1):
+        self.parallelism = parallelism
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.actions = []
+        if compute_metrics:
+            self.actions.append("computeMetrics")
+        if run_checks:
+            self.actions.append("runChecks")
+
+    def _run_action(self, dataset, partition, action):
+        attempt = 0
+        while True:
+            start = time.time()
+            try:
+                if action == "computeMetrics":
+                    result = dataset.compute_metrics(partition=partition)
+                else:
+                    result = dataset.run_checks(partition=partition)
+                return (result, time.time() - start)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                time.sleep(self.retry_delay)
+
+    def _run_target(self, target):
+        # the actions of a target run in order, and the checks are skipped if the metrics could not be computed
+        (dataset, partition) = target
+        outcomes = []
+        failed = False
+        for action in self.actions:
+            if failed:
+                outcomes.append((action, None, DataikuException("Skipped since computing the metrics failed")))
+                continue
+            try:
+                outcomes.append((action, self._run_action(dataset, partition, action), None))
+            except Exception as e:
+                outcomes.append((action, None, e))
+                failed = True
+        return outcomes
+
+    def run(self, targets):
+        """
+        Runs the actions on the datasets and partitions
+
+        :param list targets: a list of (:class:`dataikuapi.dss.dataset.DSSDataset`, partition) pairs. The partition is ''
+                             for a non-partitioned dataset, or for the whole dataset
+        :rtype: :class:`DSSMetricsChecksReport`
+        """
+        targets = list(targets)
+        report = DSSMetricsChecksReport()
+        if len(targets) > 0:
+            targets[0][0].client._ensure_connection_pool_size(self.parallelism)
+        for ((dataset, partition), outcomes, error) in dku_parallel_imap(self._run_target, targets, parallelism=self.parallelism):
+            for (action, result, action_error) in outcomes:
+                if action_error is not None:
+                    report._add_error(dataset, partition, action, action_error)
+                else:
+                    report._add_result(dataset, partition, action, result[0], result[1])
+        return report
+
+
+class DSSMetricsChecksReport(object):
+    """
+    The outcome of a :class:`DSSMetricsChecksRunner` run. Datasets are identified by their full name, "PROJECTKEY.datasetName"
+    """
+    def __init__(self):
+        self.results = []
+        self.errors = []
+        self.failed_checks = []
+        self.timings = {}
+        self._metrics = {}
+        self._computed_metrics = {}
+
+    def _add_result(self, dataset, partition, action, result, duration):
+        name = "%s.%s" % (dataset.project_key, dataset.dataset_name)
+        partition_id = partition if len(partition) > 0 else "NP"
+        self.results.append({"dataset" : name, "partition" : partition_id, "action" : action, "result" : result, "duration" : duration})
+        self._add_timing(name, duration)
+        payload = result.get("result", result) if isinstance(result, dict) else {}
+        if action == "computeMetrics":
+            metrics = self._metrics.setdefault(name, {})
+            for computed in payload.get("computed", []):
+                metric_id = computed.get("metricId", None) or computed.get("metric", {}).get("id", None)
+                metric = metrics.get(metric_id, None)
+                if metric is None:
+                    metric = {"metric" : computed.get("metric", {"id" : metric_id}), "lastValues" : []}
+                    metrics[metric_id] = metric
+                metric["lastValues"].append({"partition" : partition_id, "value" : computed.get("value", None),
+                                             "dataType" : computed.get("dataType", computed.get("type", "STRING"))})
+            self._computed_metrics.pop(name, None)
+        else:
+            for check in payload.get("results", []):
+                value = check.get("value", {})
+                if value.get("outcome", "OK") not in ["OK", "EMPTY"]:
+                    self.failed_checks.append({"dataset" : name, "partition" : partition_id,
+                                               "check" : check.get("check", {}).get("name", None),
+                                               "outcome" : value.get("outcome", None), "message" : value.get("message", None)})
+
+    def _add_error(self, dataset, partition, action, error):
+        name = "%s.%s" % (dataset.project_key, dataset.dataset_name)
+        self.errors.append({"dataset" : name, "partition" : partition if len(partition) > 0 else "NP", "action" : action, "error" : str(error)})
+
+    def _add_timing(self, name, duration):
+        timing = self.timings.setdefault(name, {"calls" : 0, "totalTime" : 0.0, "maxTime" : 0.0})
+        timing["calls"] += 1
+        timing["totalTime"] += duration
+        timing["maxTime"] = max(timing["maxTime"], duration)
+
+    def get_computed_metrics(self, dataset_name):
+        """
+        Gets the metrics computed on a dataset, on all the partitions of the run, indexed by metric and partition
+
+        :param str dataset_name: the full name of the dataset
+        :rtype: :class:`ComputedMetrics`
+        """
+        computed_metrics = self._computed_metrics.get(dataset_name, None)
+        if computed_metrics is None:
+            computed_metrics = ComputedMetrics({"metrics" : list(self._metrics.get(dataset_name, {}).values())})
+            self._computed_metrics[dataset_name] = computed_metrics
+        return computed_metrics
+
+    def get_failed_checks(self):
+        """Gets the checks whose outcome was not OK, as a list of dicts with the dataset, partition, check name, outcome and message"""
+        return list(self.failed_checks)
+
+    def get_errors(self):
+        """Gets the actions that failed, as a list of dicts with the dataset, partition, action and error message"""
+        return list(self.errors)
+
+    def get_timings(self):
+        """Gets the number of successful actions and their total and maximum durations in seconds, by dataset"""
+        return dict((name, dict(timing)) for (name, timing) in self.timings.items())
+
+    def get_summary(self):
+        """Gets a summary of the run, as a dict"""
+        return {
+            "datasets" : len(set(r["dataset"] for r in self.results) | set(e["dataset"] for e in self.errors)),
+            "actions" : len(self.results) + len(self.errors),
+            "errors" : len(self.errors),
+            "failedChecks" : len(self.failed_checks),
+            "totalTime" : sum(t["totalTime"] for t in self.timings.values())
+        }
@@ -1,7 +1,10 @@
 from ..utils import DataikuException
 from ..utils import DataikuUTF8CSVReader
 from ..utils import DataikuStreamedHttpUTF8CSVReader
+from ..utils import dku_import_numpy, dku_parallel_imap
 import json
+import numbers
+import threading
 import time
 from .metrics import ComputedMetrics
 from .utils import DSSDatasetSelectionBuilder, DSSFilterBuilder
@@ -358,26 +361,26 @@ class DSSTreeNode(object):
     def get_split_info(self):
         """Gets the information on the split, as a dict"""
         info = {}
-        features = self.tree.tree.get("feature", None)
-        probas = self.tree.tree.get("probas", None)
-        leftCategories = self.tree.tree.get("leftCategories", None)
-        impurities = self.tree.tree.get("impurity", None)
-        predicts = self.tree.tree.get("predict", None)
-        thresholds = self.tree.tree.get("threshold", None)
-        nSamples = self.tree.tree.get("nSamples", None)
+        columns = self.tree._get_columns()
+        features = columns["feature"]
         info['feature'] = self.tree.feature_names[features[self.i]] if features is not None else None
-        info['probas'] = probas[self.i] if probas is not None else None
-        info['leftCategories'] = leftCategories[self.i] if leftCategories is not None else None
-        info['impurity'] = impurities[self.i] if impurities is not None else None
-        info['predict'] = predicts[self.i] if predicts is not None else None
-        info['nSamples'] = nSamples[self.i] if nSamples is not None else None
-        info['threshold'] = thresholds[self.i] if thresholds is not None else None
+        for key in DSSTree.NODE_COLUMNS:
+            if key != "feature":
+                values = columns[key]
+                info[key] = values[self.i] if values is not None else None
         return info
  
 class DSSTree(object):
+
+    # the per-node lists of the raw tree data structure
+    NODE_COLUMNS = ["feature", "probas", "leftCategories", "impurity", "predict", "nSamples", "threshold"]
+
     def __init__(self, tree, feature_names):
         self.tree = tree
         self.feature_names = feature_names
+        self._columns = None
+        self._arrays = None
+        self._has_category_splits = None
 
     def get_raw(self):
         """Gets the raw tree data structure"""
@@ -387,9 +390,76 @@ class DSSTree(object):
         """Gets a :class:`dataikuapi.dss.ml.DSSTreeNode` representing the root of the tree"""
         return DSSTreeNode(self, 0)
 
+    def _get_columns(self):
+        if self._columns is None:
+            self._columns = dict((key, self.tree.get(key, None)) for key in DSSTree.NODE_COLUMNS)
+        return self._columns
+
+    def get_arrays(self):
+        """
+        Gets the tree as contiguous NumPy arrays, indexed by node (requires numpy). The arrays are built once, then reused.
+
+        :returns: a dict with "feature" (index of the split feature), "threshold" (samples whose feature value is lower or equal
+                  go left), "left" and "right" (index of the children, -1 for leaves) and "value" (the class probabilities
+                  of each node as a 2D array if the tree has them, the predicted value otherwise)
+        :rtype: dict
+        """
+        if self._arrays is None:
+            np = dku_import_numpy()
+            columns = self._get_columns()
+            left = np.ascontiguousarray(self.tree["leftChild"], dtype=np.int32)
+            n = len(left)
+            features = columns["feature"]
+            thresholds = columns["threshold"]
+            if columns["probas"] is not None:
+                value = np.ascontiguousarray(columns["probas"], dtype=np.float64)
+            else:
+                value = np.ascontiguousarray(columns["predict"] if columns["predict"] is not None else [np.nan] * n, dtype=np.float64)
+            self._arrays = {
+                "feature" : np.ascontiguousarray([f if f is not None else -1 for f in features] if features is not None else [-1] * n, dtype=np.int32),
+                "threshold" : np.ascontiguousarray([t if t is not None else np.nan for t in thresholds] if thresholds is not None else [np.nan] * n, dtype=np.float64),
+                "left" : left,
+                "right" : np.ascontiguousarray(self.tree["rightChild"], dtype=np.int32),
+                "value" : value
+            }
+        return self._arrays
+
+    def has_category_splits(self):
+        """Whether some nodes of the tree split on categories (leftCategories) rather than on a threshold"""
+        if self._has_category_splits is None:
+            categories = self._get_columns()["leftCategories"] or []
+            self._has_category_splits = any(c is not None and len(c) > 0 for c in categories)
+        return self._has_category_splits
+
+    def _check_can_apply(self):
+        if self.has_category_splits():
+            raise ValueError("The tree has splits on categories (leftCategories), which can't be applied locally")
+
+    def apply(self, X):
+        """
+        Gets the index of the leaf in which each sample falls (requires numpy)
+
+        :param X: the feature matrix, as a 2D array with one column per feature of :meth:`DSSTreeSet.get_feature_names`
+        :returns: a 1D array of node indices
+        """
+        self._check_can_apply()
+        return _apply_trees([self.get_arrays()], X)[0]
+
+    def predict(self, X):
+        """
+        Scores a feature matrix against the tree (requires numpy). Samples with a missing (NaN) value for a split feature
+        go right. Trees with splits on categories (see :meth:`has_category_splits`) can't be scored, and raise a ValueError
+
+        :param X: the feature matrix, as a 2D array with one column per feature of :meth:`DSSTreeSet.get_feature_names`
+        :returns: the value of the leaf of each sample: a 2D array of class probabilities if the tree has them,
+                  else a 1D array of predicted values
+        """
+        return self.get_arrays()["value"][self.apply(X)]
+
 class DSSTreeSet(object):
     def __init__(self, trees):
         self.trees = trees
+        self._trees = None
 
     def get_raw(self):
         """Gets the raw trees data structure"""
@@ -401,11 +471,65 @@ class DSSTreeSet(object):
 
     def get_trees(self):
         """Gets the list of trees as :class:`dataikuapi.dss.ml.DSSTree` """
-        return [DSSTree(t, self.trees["featureNames"]) for t in self.trees["trees"]]
+        if self._trees is None:
+            self._trees = [DSSTree(t, self.trees["featureNames"]) for t in self.trees["trees"]]
+        return list(self._trees)
+
+    def predict(self, X, aggregation="mean"):
+        """
+        Scores a feature matrix against all the trees at once (requires numpy), see :meth:`DSSTree.predict`.
+        The trees are traversed together, one level at a time for all samples. Raises a ValueError if some tree
+        has splits on categories.
+
+        :param X: the feature matrix, as a 2D array with one column per feature of :meth:`get_feature_names`
+        :param str aggregation: how to combine the values of the trees: "mean" (for random forests), "sum" (for boosted
+                                trees, whose initial value and learning rate are not part of the trees) or None
+        :returns: the aggregated values, or, if aggregation is None, an array of the values of each tree (trees first)
+        """
+        trees = self.get_trees()
+        for t in trees:
+            t._check_can_apply()
+        nodes = _apply_trees([t.get_arrays() for t in trees], X)
+        np = dku_import_numpy()
+        values = np.stack([t.get_arrays()["value"][nodes[i]] for (i, t) in enumerate(trees)])
+        if aggregation == "mean":
+            return values.mean(axis=0)
+        elif aggregation == "sum":
+            return values.sum(axis=0)
+        elif aggregation is None:
+            return values
+        else:
+            raise ValueError("Unsupported aggregation: %s" % aggregation)
+
+def _apply_trees(arrays, X):
+    """Traverses trees given as arrays for all samples at once, and returns the index of the leaf of each sample in each tree"""
+    np = dku_import_numpy()
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    # concatenate the trees, so that they are all traversed with the same fancy indexing
+    sizes = [len(a["left"]) for a in arrays]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    feature = np.concatenate([a["feature"] for a in arrays])
+    threshold = np.concatenate([a["threshold"] for a in arrays])
+    left = np.concatenate([np.where(a["left"] >= 0, a["left"] + o, -1) for (a, o) in zip(arrays, offsets)])
+    right = np.concatenate([np.where(a["right"] >= 0, a["right"] + o, -1) for (a, o) in zip(arrays, offsets)])
+
+    rows = np.arange(X.shape[0])[np.newaxis, :]
+    node = np.repeat(offsets[:, np.newaxis], X.shape[0], axis=1)
+    while True:
+        is_leaf = left[node] < 0
+        if is_leaf.all():
+            break
+        go_left = X[rows, np.where(is_leaf, 0, feature[node])] <= threshold[node]
+        node = np.where(is_leaf, node, np.where(go_left, left[node], right[node]))
+    return node - offsets[:, np.newaxis]
 
 class DSSCoefficientPaths(object):
     def __init__(self, paths):
         self.paths = paths
+        self._feature_index = None
+        self._array = None
 
     def get_raw(self):
         """Gets the raw paths data structure"""
@@ -415,18 +539,53 @@ class DSSCoefficientPaths(object):
         """Get the feature names (after dummification)"""
         return self.paths['features']
 
+    def get_feature_index(self, feature):
+        """Get the position of a feature in the feature names, which is its column in :meth:`get_array`"""
+        if self._feature_index is None:
+            self._feature_index = dict((f, i) for (i, f) in enumerate(self.paths['features']))
+        i = self._feature_index.get(feature, None)
+        if i is None:
+            raise ValueError("Feature %s is not in the coefficient paths" % feature)
+        return i
+
     def get_coefficient_path(self, feature, class_index=0):
         """Get the path of the feature"""
-        i = self.paths['features'].index(feature)
+        i = self.get_feature_index(feature)
         if i >= 0 and i < len(self.paths['path'][0][class_index]):
-            n = len(self.paths['path'])
-            return [self.paths['path'][j][class_index][i] for j in range(0, n)]
+            return [step[class_index][i] for step in self.paths['path']]
         else:
             return None
 
+    def get_array(self):
+        """
+        Get all the paths as a 3D NumPy array of coefficients, indexed by step, class and feature (requires numpy).
+        The array is built once, then reused
+        """
+        if self._array is None:
+            np = dku_import_numpy()
+            self._array = np.ascontiguousarray(self.paths['path'], dtype=np.float64)
+        return self._array
+
+    def get_coefficient_paths_array(self, features=None, class_index=0):
+        """
+        Get the paths of several features as a 2D NumPy array of coefficients, indexed by step and feature (requires numpy)
+
+        :param list features: (optional) the names of the features. If None, all features
+        :param int class_index: the index of the class, or None to get a 3D array with all classes (indexed by step, class and feature)
+        """
+        array = self.get_array()
+        if class_index is not None:
+            array = array[:, class_index, :]
+        if features is None:
+            return array
+        return array[..., [self.get_feature_index(f) for f in features]]
+
 class DSSScatterPlots(object):
     def __init__(self, scatters):
         self.scatters = scatters
+        self._feature_names = None
+        self._feature_index = None
+        self._arrays = {}
 
     def get_raw(self):
         """Gets the raw scatters data structure"""
@@ -434,16 +593,55 @@ class DSSScatterPlots(object):
 
     def get_feature_names(self):
         """Get the feature names (after dummification)"""
-        feature_names = []
-        for k in self.scatters['features']:
-            feature_names.append(k)
-        return feature_names
+        if self._feature_names is None:
+            self._feature_names = list(self.scatters['features'])
+        return list(self._feature_names)
 
     def get_scatter_plot(self, feature_x, feature_y):
         """Get the scatter plot between feature_x and feature_y"""
-        ret = {'cluster':self.scatters['cluster'], 'x':self.scatters['features'].get(feature_x, None), 'y':self.scatters['features'].get(feature_x, None)}
+        ret = {'cluster':self.scatters['cluster'], 'x':self.scatters['features'].get(feature_x, None), 'y':self.scatters['features'].get(feature_y, None)}
         return ret
 
+    def get_cluster_array(self):
+        """Get the cluster of each point, as a NumPy array (requires numpy)"""
+        if None not in self._arrays:
+            np = dku_import_numpy()
+            self._arrays[None] = np.asarray(self.scatters['cluster'])
+        return self._arrays[None]
+
+    def get_feature_array(self, feature):
+        """Get the values of a feature for each point, as a NumPy array (requires numpy). Arrays are built once, then reused"""
+        if feature not in self._arrays:
+            np = dku_import_numpy()
+            values = self.scatters['features'].get(feature, None)
+            if values is None:
+                raise ValueError("Feature %s is not in the scatter plots" % feature)
+            try:
+                self._arrays[feature] = np.asarray(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                self._arrays[feature] = np.asarray(values, dtype=object)
+        return self._arrays[feature]
+
+    def get_array(self, features=None):
+        """
+        Get the values of several features as a 2D NumPy array, indexed by point and feature (requires numpy).
+        The array holds floats if all the features are numerical, objects otherwise
+
+        :param list features: (optional) the names of the features, in the order of the columns. If None, all features,
+                              in the order of :meth:`get_feature_names`
+        """
+        np = dku_import_numpy()
+        if features is None:
+            features = self.get_feature_names()
+        columns = [self.get_feature_array(f) for f in features]
+        if len(columns) == 0:
+            return np.empty((len(self.scatters['cluster']), 0))
+        return np.column_stack(columns)
+
+    def get_scatter_plot_arrays(self, feature_x, feature_y):
+        """Get the scatter plot between feature_x and feature_y, as a tuple of NumPy arrays (x, y, cluster) (requires numpy)"""
+        return (self.get_feature_array(feature_x), self.get_feature_array(feature_y), self.get_cluster_array())
+
 class DSSTrainedPredictionModelDetails(DSSTrainedModelDetails):
     """
     Object to read details of a trained prediction model
@@ -868,15 +1066,31 @@ class DSSMLTask(object):
         :return: A :class:`DSSTrainedPredictionModelDetails` or :class:`DSSTrainedClusteringModelDetails` representing the details of this trained model id
         :rtype: :class:`DSSTrainedPredictionModelDetails` or :class:`DSSTrainedClusteringModelDetails`
         """
+        return self._get_trained_model_details(id, self.get_trained_model_snippet(id))
+
+    def _get_trained_model_details(self, id, snippet):
         ret = self.client._perform_json(
             "GET", "/projects/%s/models/lab/%s/%s/models/%s/details" % (self.project_key, self.analysis_id, self.mltask_id,id))
-        snippet = self.get_trained_model_snippet(id)
 
         if "facts" in ret:
             return DSSTrainedClusteringModelDetails(ret, snippet, mltask=self, mltask_model_id=id)
         else:
             return DSSTrainedPredictionModelDetails(ret, snippet, mltask=self, mltask_model_id=id)
 
+    def get_leaderboard(self, session_id=None, parallelism=8):
+        """
+        Gets a leaderboard of the trained models of this ML task. The snippets of all models are fetched in a single call,
+        and the details of a model are only fetched when accessed
+
+        :param str session_id: (optional) only keep the models of this train session
+        :param int parallelism: the maximum number of concurrent calls when fetching the details of several models
+        :rtype: :class:`DSSMLTaskLeaderboard`
+        """
+        snippets = self.get_trained_model_snippet()
+        if session_id is not None:
+            snippets = dict((id, snippet) for (id, snippet) in snippets.items() if snippet.get("sessionId", None) == session_id)
+        return DSSMLTaskLeaderboard(self, snippets, parallelism=parallelism)
+
     def deploy_to_flow(self, model_id, model_name, train_dataset, test_dataset=None, redo_optimization=True):
         """
         Deploys a trained model from this ML Task to a saved model + train recipe in the Flow.
@@ -921,3 +1135,206 @@ class DSSMLTask(object):
             "POST", "/projects/%s/models/lab/%s/%s/models/%s/actions/redeployToFlow" % (self.project_key, self.analysis_id, self.mltask_id, model_id),
             body = obj)
 
+
+class DSSMLTaskLeaderboard(object):
+    """
+    The trained models of a ML task, with their snippets. The details of the models are fetched lazily, concurrently when
+    several are requested at once, and cached.
+
+    Do not create this object directly, use :meth:`DSSMLTask.get_leaderboard` instead
+    """
+    def __init__(self, mltask, snippets, parallelism=8):
+        self.mltask = mltask
+        self.snippets = snippets
+        self.parallelism = parallelism
+        self.details = {}
+        self.lock = threading.Lock()
+
+    def get_model_ids(self):
+        """Gets the identifiers of the models of the leaderboard"""
+        return list(self.snippets.keys())
+
+    def get_snippet(self, id):
+        """Gets the snippet of a model, as a dict"""
+        return self.snippets[id]
+
+    def get_details(self, id):
+        """
+        Gets the details of a model, fetching them on first access
+
+        :rtype: :class:`DSSTrainedPredictionModelDetails` or :class:`DSSTrainedClusteringModelDetails`
+        """
+        with self.lock:
+            details = self.details.get(id, None)
+        if details is None:
+            details = self.mltask._get_trained_model_details(id, self.snippets[id])
+            with self.lock:
+                self.details[id] = details
+        return details
+
+    def iter_details(self, ids=None):
+        """
+        Fetches the details of several models concurrently, and yields a tuple (model id, details) for each model as soon
+        as its details are available. Details already fetched are not fetched again
+
+        :param list ids: (optional) the identifiers of the models. If None, all the models of the leaderboard
+        """
+        ids = list(ids) if ids is not None else self.get_model_ids()
+        with self.lock:
+            todo = [id for id in ids if id not in self.details]
+            done = [(id, self.details[id]) for id in ids if id in self.details]
+        for item in done:
+            yield item
+        self.mltask.client._ensure_connection_pool_size(self.parallelism)
+        for (id, details, error) in dku_parallel_imap(self.get_details, todo, parallelism=self.parallelism):
+            if error is not None:
+                raise error
+            yield (id, details)
+
+    def prefetch_details(self, ids=None):
+        """Fetches the details of several models concurrently, so that :meth:`get_details` then returns immediately"""
+        for item in self.iter_details(ids):
+            pass
+
+    def get_metrics_table(self, metrics=None, ids=None):
+        """
+        Gets the metrics of the models as a table, by column. Metrics come from the snippets, so no call is made.
+
+        :param list metrics: (optional) the names of the metrics, as in the snippets ("auc", "f1", "rmse", ...). If None,
+                             all the numerical fields found in the snippets
+        :param list ids: (optional) the identifiers of the models, in the order of the rows. If None, all models
+        :returns: a dict of column name to list of values, with the "modelId", "algorithm" and "sessionId" columns, and
+                  a column for each metric (None for models that don't have the metric)
+        """
+        ids = list(ids) if ids is not None else self.get_model_ids()
+        if metrics is None:
+            names = set()
+            for id in ids:
+                for (k, v) in self.snippets[id].items():
+                    if isinstance(v, numbers.Number) and not isinstance(v, bool):
+                        names.add(k)
+            metrics = sorted(names)
+        table = {
+            "modelId" : ids,
+            "algorithm" : [self.snippets[id].get("algorithm", None) for id in ids],
+            "sessionId" : [self.snippets[id].get("sessionId", None) for id in ids]
+        }
+        for metric in metrics:
+            table[metric] = [self.snippets[id].get(metric, None) for id in ids]
+        return table
+
+    def get_best_model_id(self, metric, greater_is_better=True):
+        """
+        Gets the identifier of the model with the best value of a metric, or None if no model has it
+
+        :param str metric: the name of the metric, as in the snippets ("auc", "f1", "rmse", ...)
+        :param bool greater_is_better: whether higher values of the metric are better
+        """
+        best = None
+        for (id, snippet) in self.snippets.items():
+            value = snippet.get(metric, None)
+            if value is None:
+                continue
+            if best is None or (value > best[1] if greater_is_better else value < best[1]):
+                best = (id, value)
+        return best[0] if best is not None else None
+
+
+class DSSMLTasksTrainer(object):
+    """
+    Trains many ML tasks, with a limit on the number of trainings running at once, and polls the status of all the
+    running trainings from a single loop. Optionally deploys the best model of each training to the Flow.
+
+    Add ML tasks with :meth:`add`, then iterate on :meth:`run`
+
+    :param int max_concurrent: the maximum number of ML tasks training at once
+    :param float poll_interval: the number of seconds between two polls of the statuses of the running trainings
+    """
+    def __init__(self, max_concurrent=4, poll_interval=2):
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.pending = []
+
+    def add(self, mltask, session_name=None, session_description=None, metric=None, greater_is_better=True, deploy=None, redeploy=None):
+        """
+        Adds a ML task to train
+
+        :param mltask: the :class:`DSSMLTask` to train
+        :param str session_name: (optional) name for the train session
+        :param str session_description: (optional) description for the train session
+        :param str metric: (optional) the metric by which to pick the best model of the session, as in the model snippets
+                           ("auc", "f1", "rmse", ...)
+        :param bool greater_is_better: whether higher values of the metric are better
+        :param dict deploy: (optional) to deploy the best model with :meth:`DSSMLTask.deploy_to_flow`, its arguments other than
+                            model_id, for example {"model_name": "my model", "train_dataset": "train"}. Requires a metric
+        :param dict redeploy: (optional) to redeploy the best model with :meth:`DSSMLTask.redeploy_to_flow`, its arguments other
+                              than model_id, for example {"saved_model_id": "abcd1234"}. Requires a metric
+        """
+        if (deploy is not None or redeploy is not None) and metric is None:
+            raise ValueError("A metric is required to deploy the best model")
+        self.pending.append({"mltask" : mltask, "sessionName" : session_name, "sessionDescription" : session_description,
+                             "metric" : metric, "greaterIsBetter" : greater_is_better, "deploy" : deploy, "redeploy" : redeploy})
+
+    def run(self):
+        """
+        Trains the added ML tasks, and yields the outcome of each training as soon as it completes, as a dict with the fields
+        "mltask", "sessionId", "modelIds" (the models trained in the session), "bestModelId", "deployment" (the result of the
+        deployment, if any) and "error" (the exception that interrupted the training, or None). If DSS did not return the id
+        of the session when starting the training, the outcome has an error, and no model is picked or deployed
+        """
+        pending = list(self.pending)
+        self.pending = []
+        running = []
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < self.max_concurrent:
+                task = pending.pop(0)
+                try:
+                    train_ret = task["mltask"].start_train(task["sessionName"], task["sessionDescription"])
+                    task["sessionId"] = train_ret.get("sessionId", None)
+                    running.append(task)
+                except Exception as e:
+                    yield self._outcome(task, error=e)
+
+            completed = []
+            for task in running:
+                try:
+                    status = task["mltask"].get_status()
+                except Exception as e:
+                    completed.append(task)
+                    yield self._outcome(task, error=e)
+                    continue
+                if status.get("training", "???") == False:
+                    completed.append(task)
+                    yield self._complete(task, status)
+            running = [task for task in running if task not in completed]
+            if len(completed) == 0 and len(running) > 0:
+                time.sleep(self.poll_interval)
+
+    def run_all(self):
+        """Trains the added ML tasks, and returns the list of the outcomes of the trainings. See :meth:`run`"""
+        return list(self.run())
+
+    def _complete(self, task, status):
+        mltask = task["mltask"]
+        if task["sessionId"] is None:
+            # the models of the session can't be told apart from the models of earlier sessions
+            return self._outcome(task, error=DataikuException("No session id was returned when starting the training, "
+                                                              "its models can't be identified"))
+        try:
+            model_ids = [fmi["id"] for fmi in status.get("fullModelIds", [])
+                         if fmi.get("fullModelId", {}).get("sessionId", "") == task["sessionId"]]
+            best_model_id = None
+            deployment = None
+            if task["metric"] is not None:
+                best_model_id = mltask.get_leaderboard(session_id=task["sessionId"]).get_best_model_id(task["metric"], task["greaterIsBetter"])
+                if best_model_id is not None and task["deploy"] is not None:
+                    deployment = mltask.deploy_to_flow(best_model_id, **task["deploy"])
+                elif best_model_id is not None and task["redeploy"] is not None:
+                    deployment = mltask.redeploy_to_flow(best_model_id, **task["redeploy"])
+            return self._outcome(task, model_ids, best_model_id, deployment)
+        except Exception as e:
+            return self._outcome(task, error=e)
+
+    def _outcome(self, task, model_ids=None, best_model_id=None, deployment=None, error=None):
+        return {"mltask" : task["mltask"], "sessionId" : task.get("sessionId", None), "modelIds" : model_ids,
+                "bestModelId" : best_model_id, "deployment" : deployment, "error" : error}
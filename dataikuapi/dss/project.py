@@ -16,6 +16,7 @@ from .discussion import DSSObjectDiscussions
 from .ml import DSSMLTask
 from .analysis import DSSAnalysis
 from dataikuapi.utils import DataikuException
+from ..tracing import dku_trace_span
 
 
 class DSSProject(object):
@@ -60,19 +61,36 @@ class DSSProject(object):
         return self.client._perform_raw(
             "POST", "/projects/%s/export" % self.project_key, body=options).raw
 
-    def export_to_file(self, path, options={}):
+    def export_to_file(self, path, options={}, buffer_size=8388608, retries=3, progress_callback=None, checksum=True):
         """
         Export the project to a file
+
+        If the download fails, it is retried. It resumes where it stopped when DSS supports range requests
+        on the export, and restarts from the beginning otherwise.
         
         :param str path: the path of the file in which the exported project should be saved
+        :param int buffer_size: the size in bytes of the reads and writes
+        :param int retries: the number of times a failed download is retried
+        :param progress_callback: (optional) a function called with the number of bytes written so far and the
+                                  total size of the export (None if unknown) as the download progresses
+        :param bool checksum: whether to compute the SHA-256 of the file
+        :returns: a dict with the size of the file ("bytesWritten"), its hex SHA-256 ("sha256"), and the number of
+                  retries ("retries") and of resumed downloads ("resumed")
         """
         with open(path, 'wb') as f:
-            export_stream = self.client._perform_raw(
-                "POST", "/projects/%s/export" % self.project_key, body=options)
-            for chunk in export_stream.iter_content(chunk_size=32768):
-                if chunk:
-                    f.write(chunk)
-            f.flush()
+            return self.export_to_file_object(f, options=options, buffer_size=buffer_size, retries=retries,
+                                              progress_callback=progress_callback, checksum=checksum)
+
+    def export_to_file_object(self, f, options={}, buffer_size=8388608, retries=3, progress_callback=None, checksum=True):
+        """
+        Export the project to a file-like object. See :meth:`export_to_file` for the parameters
+
+        :param f: a file-like object opened for writing in binary mode. It must be seekable, for the download
+                  to be restarted from the beginning if it fails
+        """
+        return self.client._download_to_file("POST", "/projects/%s/export" % self.project_key, f, body=options,
+                                             buffer_size=buffer_size, retries=retries,
+                                             progress_callback=progress_callback, checksum=checksum)
 
     ########################################################
     # Project infos
@@ -431,10 +449,15 @@ class DSSProject(object):
             Optionally, a refreshHiveMetastore field can specify whether to re-synchronize the Hive metastore for recomputed
             HDFS datasets.
         """
-        job_def = self.client._perform_json("POST", "/projects/%s/jobs/" % self.project_key, body = definition)
-        job = DSSJob(self.client, self.project_key, job_def['id'])
-        waiter = DSSJobWaiter(job)
-        return waiter.wait(no_fail)
+        with dku_trace_span(self.client, "dss.project.start_job_and_wait", {"dss.project_key" : self.project_key}) as span:
+            job_def = self.client._perform_json("POST", "/projects/%s/jobs/" % self.project_key, body = definition)
+            job = DSSJob(self.client, self.project_key, job_def['id'])
+            span.set_attribute("dss.job_id", job.id)
+            waiter = DSSJobWaiter(job)
+            try:
+                return waiter.wait(no_fail)
+            finally:
+                span.set_attribute("dss.poll_count", waiter.poll_count)
 
     def new_job_definition_builder(self, job_type='NON_RECURSIVE_FORCED_BUILD'):
         return JobDefinitionBuilder(self.project_key, job_type)
@@ -525,21 +548,27 @@ class DSSProject(object):
         return self.client._perform_raw("GET",
                 "/projects/%s/bundles/exported/%s/archive" % (self.project_key, bundle_id))
 
-    def download_exported_bundle_archive_to_file(self, bundle_id, path):
+    def download_exported_bundle_archive_to_file(self, bundle_id, path, buffer_size=8388608, retries=3, progress_callback=None, checksum=True):
         """
         Download a bundle archive that can be deployed in a DSS automation Node into the given output file.
-        @param path if "-", will write to /dev/stdout
+        If the download fails, it is retried, and resumed where it stopped when DSS supports range requests.
+        @param path if "-", will write to /dev/stdout. Since stdout cannot be rewound, the download is then not retried
+        @param buffer_size the size in bytes of the reads and writes
+        @param retries the number of times a failed download is retried
+        @param progress_callback (optional) a function called with the number of bytes written so far and the total size (None if unknown)
+        @param checksum whether to compute the SHA-256 of the archive
+        @return a dict with the size of the archive ("bytesWritten"), its hex SHA-256 ("sha256"), and the number of
+                retries ("retries") and of resumed downloads ("resumed")
         """
         if path == "-":
             path= "/dev/stdout"
-        stream = self.get_exported_bundle_archive_stream(bundle_id)
+            # a retry that cannot resume would seek back and truncate the output
+            retries = 0
 
         with open(path, 'wb') as f:
-            for chunk in stream.iter_content(chunk_size=10000):
-                if chunk:
-                    f.write(chunk)
-                    f.flush()
-        stream.close()
+            return self.client._download_to_file("GET", "/projects/%s/bundles/exported/%s/archive" % (self.project_key, bundle_id), f,
+                                                 buffer_size=buffer_size, retries=retries,
+                                                 progress_callback=progress_callback, checksum=checksum)
 
 
     ########################################################
@@ -2,6 +2,7 @@ from datetime import datetime
 import time
 from dataikuapi.utils import DataikuException
 from .discussion import DSSObjectDiscussions
+from ..tracing import dku_trace_span
 
 
 class DSSScenario(object):
@@ -57,10 +58,15 @@ class DSSScenario(object):
         Returns:
             A :class:`dataikuapi.dss.admin.DSSScenarioRun` run handle
         """
-        trigger_fire = self.run(params)
-        scenario_run = trigger_fire.wait_for_scenario_run(no_fail)
-        waiter = DSSScenarioRunWaiter(scenario_run, trigger_fire)
-        return waiter.wait(no_fail)
+        with dku_trace_span(self.client, "dss.scenario.run_and_wait", {"dss.project_key" : self.project_key, "dss.scenario_id" : self.id}) as span:
+            trigger_fire = self.run(params)
+            waiter = None
+            try:
+                scenario_run = trigger_fire.wait_for_scenario_run(no_fail)
+                waiter = DSSScenarioRunWaiter(scenario_run, trigger_fire)
+                return waiter.wait(no_fail)
+            finally:
+                span.set_attribute("dss.poll_count", trigger_fire.poll_count + (waiter.poll_count if waiter is not None else 0))
 
     def get_last_runs(self, limit=10, only_finished_runs=False):
         """
@@ -220,10 +226,12 @@ class DSSScenarioRunWaiter(object):
     def __init__(self, scenario_run, trigger_fire):
         self.trigger_fire = trigger_fire
         self.scenario_run = scenario_run
+        self.poll_count = 0
 
     def wait(self, no_fail=False):
         while not self.scenario_run.run.get('result', False):
             self.scenario_run = self.trigger_fire.get_scenario_run()
+            self.poll_count += 1
             time.sleep(5)
         outcome = self.scenario_run.run.get('result', None).get('outcome', 'UNKNOWN')
         if outcome == 'SUCCESS' or no_fail:
@@ -243,6 +251,7 @@ class DSSTriggerFire(object):
         self.trigger_id = trigger_fire['trigger']['id']
         self.run_id = trigger_fire['runId']
         self.trigger_fire = trigger_fire
+        self.poll_count = 0
 
     def get_scenario_run(self):
         """
@@ -284,5 +293,6 @@ class DSSTriggerFire(object):
                 else:
                     raise DataikuException("Scenario run has been cancelled")
             scenario_run = self.get_scenario_run()
+            self.poll_count += 1
             time.sleep(5)
         return scenario_run
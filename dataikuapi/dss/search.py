@@ -0,0 +1,294 @@
+import json
+import sqlite3
+import time
+from ..utils import dku_parallel_imap
+
+class DSSContentSearchIndex(object):
+    """
+    A local full-text index of the wiki articles and discussions of projects, stored in a SQLite database.
+
+    The text of each article, and of each discussion with all its replies, is stored in a SQLite FTS table (FTS5 when
+    available, FTS4 otherwise), along with its project, object, and modification time so that a later crawl only
+    fetches and re-indexes what changed. Use a :class:`DSSContentSearchCrawler` or
+    :meth:`dataikuapi.DSSClient.update_content_search_index` to fill it.
+
+    :param str path: the path of the SQLite database. Use ":memory:" for a transient index
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS search_projects (project_key TEXT PRIMARY KEY, version_tag TEXT, crawl_time INTEGER)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS search_documents (id INTEGER PRIMARY KEY, project_key TEXT, object_type TEXT, object_id TEXT, "
+                                + "discussion_id TEXT, title TEXT, last_modified INTEGER, UNIQUE (project_key, object_type, object_id, discussion_id))")
+        row = self.connection.execute("SELECT sql FROM sqlite_master WHERE name = 'search_text'").fetchone()
+        if row is not None:
+            self.fts_version = 5 if "fts5" in row[0].lower() else 4
+        else:
+            try:
+                self.connection.execute("CREATE VIRTUAL TABLE search_text USING fts5(title, text)")
+                self.fts_version = 5
+            except sqlite3.OperationalError:
+                self.connection.execute("CREATE VIRTUAL TABLE search_text USING fts4(title, text)")
+                self.fts_version = 4
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def _maybe_commit(self):
+        self.uncommitted += 1
+        if self.uncommitted >= 100:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def get_project_version_tag(self, project_key):
+        """Gets the version tag of a project when it was last indexed, or None if it was never indexed"""
+        row = self.connection.execute("SELECT version_tag FROM search_projects WHERE project_key = ?", (project_key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set_project_version_tag(self, project_key, version_tag):
+        """Records that a project was completely indexed at a given version tag"""
+        self.connection.execute("INSERT OR REPLACE INTO search_projects VALUES (?, ?, ?)",
+                                (project_key, json.dumps(version_tag), int(time.time() * 1000)))
+        self._maybe_commit()
+
+    def list_project_keys(self):
+        """Lists the keys of the indexed projects"""
+        return [row[0] for row in self.connection.execute("SELECT project_key FROM search_projects")]
+
+    def get_documents_last_modified(self, project_key):
+        """
+        Gets the modification times of the indexed documents of a project
+
+        :returns: a dict of (object type, object id, discussion id) to modification time. The discussion id is "" for articles
+        """
+        rows = self.connection.execute("SELECT object_type, object_id, discussion_id, last_modified FROM search_documents WHERE project_key = ?", (project_key,))
+        return dict(((row[0], row[1], row[2]), row[3]) for row in rows)
+
+    def add_document(self, project_key, object_type, object_id, discussion_id, title, text, last_modified):
+        """
+        Adds or replaces a document in the index
+
+        :param str project_key: the project key
+        :param str object_type: the type of the object, "ARTICLE" for the body of an article
+        :param str object_id: the id of the object
+        :param str discussion_id: the id of the discussion, or "" for the body of an article
+        :param str title: the name of the article, or the topic of the discussion
+        :param str text: the text to index
+        :param int last_modified: the modification time of the document, in milliseconds since epoch
+        """
+        self.remove_document(project_key, object_type, object_id, discussion_id)
+        cursor = self.connection.execute("INSERT INTO search_documents (project_key, object_type, object_id, discussion_id, title, last_modified) VALUES (?, ?, ?, ?, ?, ?)",
+                                         (project_key, object_type, object_id, discussion_id, title, last_modified))
+        self.connection.execute("INSERT INTO search_text (rowid, title, text) VALUES (?, ?, ?)", (cursor.lastrowid, title or "", text or ""))
+        self._maybe_commit()
+
+    def remove_document(self, project_key, object_type, object_id, discussion_id):
+        """Removes a document from the index, if it is there"""
+        row = self.connection.execute("SELECT id FROM search_documents WHERE project_key = ? AND object_type = ? AND object_id = ? AND discussion_id = ?",
+                                      (project_key, object_type, object_id, discussion_id)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM search_text WHERE rowid = ?", (row[0],))
+            self.connection.execute("DELETE FROM search_documents WHERE id = ?", (row[0],))
+
+    def remove_project(self, project_key):
+        """Removes all the documents of a project from the index"""
+        self.connection.execute("DELETE FROM search_text WHERE rowid IN (SELECT id FROM search_documents WHERE project_key = ?)", (project_key,))
+        self.connection.execute("DELETE FROM search_documents WHERE project_key = ?", (project_key,))
+        self.connection.execute("DELETE FROM search_projects WHERE project_key = ?", (project_key,))
+        self.connection.commit()
+
+    def search(self, query, project_keys=None, object_types=None, limit=50):
+        """
+        Searches the indexed articles and discussions
+
+        :param str query: the full-text query, in the SQLite FTS query syntax. For example "pipeline", "spark AND join" or "\\"data quality\\""
+        :param list project_keys: (optional) only search in these projects
+        :param list object_types: (optional) only search the articles and discussions on objects of these types, for example ["ARTICLE"]
+        :param int limit: the maximum number of results
+        :returns: a list of results, the best matches first with FTS5, the most recent first with FTS4. Each result is a dict
+                  with the fields "projectKey", "objectType", "objectId", "discussionId" (None for the body of an article),
+                  "title", "lastModified" and "snippet" (an excerpt of the text, with the matches between brackets)
+        """
+        self.connection.commit()
+        if self.fts_version == 5:
+            sql = "SELECT d.project_key, d.object_type, d.object_id, d.discussion_id, d.title, d.last_modified, snippet(search_text, 1, '[', ']', '...', 16) " \
+                  + "FROM search_text JOIN search_documents d ON d.id = search_text.rowid WHERE search_text MATCH ?"
+        else:
+            sql = "SELECT d.project_key, d.object_type, d.object_id, d.discussion_id, d.title, d.last_modified, snippet(search_text, '[', ']', '...', 1, 16) " \
+                  + "FROM search_text JOIN search_documents d ON d.id = search_text.rowid WHERE search_text MATCH ?"
+        args = [query]
+        if project_keys is not None:
+            sql += " AND d.project_key IN (%s)" % ", ".join("?" * len(project_keys))
+            args.extend(project_keys)
+        if object_types is not None:
+            sql += " AND d.object_type IN (%s)" % ", ".join("?" * len(object_types))
+            args.extend(object_types)
+        sql += " ORDER BY rank LIMIT ?" if self.fts_version == 5 else " ORDER BY d.last_modified DESC LIMIT ?"
+        args.append(limit)
+        return [{"projectKey" : row[0], "objectType" : row[1], "objectId" : row[2], "discussionId" : row[3] if row[3] != "" else None,
+                 "title" : row[4], "lastModified" : row[5], "snippet" : row[6]} for row in self.connection.execute(sql, args)]
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class DSSContentSearchCrawler(object):
+    """
+    Crawls the wiki articles and discussions of many projects concurrently, and updates a :class:`DSSContentSearchIndex`.
+
+    The crawl is incremental: only the discussions with new replies are fetched again. Articles cannot be listed with their
+    modification time, so all the articles are fetched, but only the modified ones are re-indexed. Articles and discussions
+    that were deleted are removed from the index.
+
+    To simply update an index, use :meth:`dataikuapi.DSSClient.update_content_search_index`
+
+    :param client: the :class:`dataikuapi.DSSClient` to crawl with
+    :param int parallelism: the maximum number of concurrent calls
+    :param int retries: the number of times a failed call is retried
+    :param list discussion_object_types: the types of the objects whose discussions are indexed. Listing the discussions
+                                         takes a call per object, so leave out the types that are not discussed
+    :param bool trust_project_version_tag: whether to skip without further calls the projects whose version tag did not
+                                           change since they were last indexed. Editing an article or replying to a
+                                           discussion does not always change the version tag of the project, so this
+                                           can leave such changes unindexed
+    """
+
+    # how to list the objects of each type that can be discussed, and the field holding their id
+    DISCUSSION_OBJECT_TYPES = {
+        "DATASET" : ("list_datasets", "name"),
+        "RECIPE" : ("list_recipes", "name"),
+        "SAVED_MODEL" : ("list_saved_models", "id"),
+        "MANAGED_FOLDER" : ("list_managed_folders", "id"),
+        "SCENARIO" : ("list_scenarios", "id")
+    }
+
+    def __init__(self, client, parallelism=8, retries=1, discussion_object_types=("PROJECT", "ARTICLE", "DATASET", "RECIPE", "SAVED_MODEL", "MANAGED_FOLDER", "SCENARIO"),
+                 trust_project_version_tag=False):
+        self.client = client
+        self.parallelism = parallelism
+        self.retries = retries
+        self.discussion_object_types = discussion_object_types
+        self.trust_project_version_tag = trust_project_version_tag
+
+    def _list_objects(self, task):
+        (project_key, kind) = task
+        project = self.client.get_project(project_key)
+        if kind == "ARTICLE":
+            return [article.article_id for article in project.get_wiki().list_articles()]
+        (list_method, id_field) = DSSContentSearchCrawler.DISCUSSION_OBJECT_TYPES[kind]
+        return [item[id_field] for item in getattr(project, list_method)()]
+
+    def _fetch(self, task):
+        (project_key, kind, object_type, object_id, discussion_id) = task
+        if kind == "article":
+            return self.client.get_project(project_key).get_wiki().get_article(object_id).get_data()
+        discussions = self.client.get_object_discussions(project_key, object_type, object_id)
+        if kind == "discussions":
+            return discussions.list_discussions()
+        return discussions.get_discussion(discussion_id)
+
+    def _run(self, fn, tasks, errors):
+        for (task, result, error) in dku_parallel_imap(fn, tasks, parallelism=self.parallelism, retries=self.retries):
+            if error is not None:
+                errors[task[0]] = errors.get(task[0], 0) + 1
+                continue
+            yield (task, result)
+
+    def crawl(self, index, project_keys=None):
+        """
+        Updates the index with the articles and discussions of the projects
+
+        :param index: the :class:`DSSContentSearchIndex` to update
+        :param list project_keys: (optional) the keys of the projects to crawl. If None, all projects are crawled, and
+                                  the projects that no longer exist are removed from the index
+        :returns: a dict with the keys of the projects that were crawled ("crawled"), skipped because their version tag did
+                  not change ("unchanged", only with ``trust_project_version_tag``) and that could not be completely crawled ("failed", they are crawled again next time),
+                  and the number of documents that were indexed ("indexed") and removed ("removed")
+        """
+        projects = self.client.list_projects()
+        if project_keys is not None:
+            wanted = set(project_keys)
+            projects = [p for p in projects if p["projectKey"] in wanted]
+        else:
+            existing = set(p["projectKey"] for p in projects)
+            for project_key in index.list_project_keys():
+                if project_key not in existing:
+                    index.remove_project(project_key)
+
+        report = {"crawled" : [], "unchanged" : [], "failed" : [], "indexed" : 0, "removed" : 0}
+        version_tags = {}
+        for p in projects:
+            version_tag = p.get("versionTag", None)
+            if self.trust_project_version_tag and version_tag is not None and index.get_project_version_tag(p["projectKey"]) == version_tag:
+                report["unchanged"].append(p["projectKey"])
+            else:
+                version_tags[p["projectKey"]] = version_tag
+        if len(version_tags) == 0:
+            return report
+
+        self.client._ensure_connection_pool_size(self.parallelism)
+        errors = {}
+        previous = dict((project_key, index.get_documents_last_modified(project_key)) for project_key in version_tags)
+        seen = dict((project_key, set()) for project_key in version_tags)
+
+        # list the articles, and the objects that may be discussed
+        kinds = ["ARTICLE"] + [t for t in self.discussion_object_types if t in DSSContentSearchCrawler.DISCUSSION_OBJECT_TYPES]
+        fetches = []
+        for project_key in version_tags:
+            if "PROJECT" in self.discussion_object_types:
+                fetches.append((project_key, "discussions", "PROJECT", project_key, None))
+        for ((project_key, kind), object_ids) in self._run(self._list_objects, [(k, kind) for k in version_tags for kind in kinds], errors):
+            for object_id in object_ids:
+                if kind == "ARTICLE":
+                    fetches.append((project_key, "article", "ARTICLE", object_id, None))
+                if kind in self.discussion_object_types:
+                    fetches.append((project_key, "discussions", kind, object_id, None))
+
+        # fetch the articles and the discussion lists, and index the modified articles
+        discussion_fetches = []
+        for ((project_key, kind, object_type, object_id, _), result) in self._run(self._fetch, fetches, errors):
+            if kind == "article":
+                metadata = result.get_metadata() or {}
+                last_modified = _get_last_modified(metadata)
+                key = ("ARTICLE", object_id, "")
+                seen[project_key].add(key)
+                if last_modified is None or previous[project_key].get(key, None) != last_modified:
+                    index.add_document(project_key, "ARTICLE", object_id, "", metadata.get("name", object_id), result.get_body(), last_modified)
+                    report["indexed"] += 1
+            else:
+                for discussion in result:
+                    metadata = discussion.get_metadata()
+                    last_modified = metadata.get("lastReplyTime", None)
+                    key = (object_type, object_id, discussion.discussion_id)
+                    seen[project_key].add(key)
+                    if last_modified is None or previous[project_key].get(key, None) != last_modified:
+                        discussion_fetches.append((project_key, "discussion", object_type, object_id, discussion.discussion_id))
+
+        # fetch the replies of the new and updated discussions
+        for ((project_key, _, object_type, object_id, discussion_id), discussion) in self._run(self._fetch, discussion_fetches, errors):
+            metadata = discussion.get_metadata()
+            replies = discussion.get_replies()
+            last_modified = metadata.get("lastReplyTime", None)
+            if last_modified is None and len(replies) > 0:
+                last_modified = max(reply.get_raw_data().get("time", 0) for reply in replies)
+            text = "\n\n".join(reply.get_raw_data().get("text", None) or "" for reply in replies)
+            index.add_document(project_key, object_type, object_id, discussion_id, metadata.get("topic", None), text, last_modified)
+            report["indexed"] += 1
+
+        for (project_key, version_tag) in version_tags.items():
+            if errors.get(project_key, 0) > 0:
+                # some documents may be missing from what was seen, so keep the old ones and crawl again next time
+                report["failed"].append(project_key)
+                continue
+            for key in previous[project_key]:
+                if key not in seen[project_key]:
+                    index.remove_document(project_key, key[0], key[1], key[2])
+                    report["removed"] += 1
+            index.set_project_version_tag(project_key, version_tag)
+            report["crawled"].append(project_key)
+        index.connection.commit()
+        return report
+
+
+def _get_last_modified(article_metadata):
+    version_tag = article_metadata.get("versionTag", None) or {}
+    return version_tag.get("lastModifiedOn", article_metadata.get("lastModifiedOn", None))
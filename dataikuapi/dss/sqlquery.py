@@ -1,6 +1,7 @@
 from ..utils import DataikuException
 from ..utils import DataikuUTF8CSVReader
-from ..utils import DataikuStreamedHttpUTF8CSVReader
+from ..utils import DataikuStreamedHttpUTF8CSVReader, dku_copy_stream_to_file
+from contextlib import closing
 
 class DSSSQLQuery(object):
     """
@@ -30,6 +31,7 @@ class DSSSQLQuery(object):
                     "extraConf" : extra_conf
                 })
         self.queryId = self.streaming_session['queryId']
+        self.reader = None
 
     def get_schema(self):
         """
@@ -40,10 +42,16 @@ class DSSSQLQuery(object):
         """
         return self.streaming_session['schema']
 
-    def iter_rows(self):
+    def iter_rows(self, profile=None, prefetch=0):
         """
         Get the query's results
         
+        Args:
+            profile: (optional) a :class:`dataikuapi.utils.DataikuStreamProfile` in which to record where
+                the time of the iteration is spent (network, tokenization, casting, consumer)
+            prefetch: if > 0, the results are downloaded and decoded on a background thread, up to this
+                number of batches of rows ahead of the consumer. Close the iterator to stop the download early
+
         Returns:
             an iterator over the rows, each row being a tuple of values. The order of values
             in the tuples is the same as the order of columns in the schema returned by get_schema
@@ -54,7 +62,32 @@ class DSSSQLQuery(object):
                     "format" : "tsv-excel-noheader"
                 })
 
-        return DataikuStreamedHttpUTF8CSVReader(self.get_schema(), csv_stream).iter_rows()
+        self.reader = DataikuStreamedHttpUTF8CSVReader(self.get_schema(), csv_stream, profile=profile, prefetch=prefetch)
+        return self.reader.iter_rows()
+
+    def download_to_file(self, path, format="tsv-excel-header", compression=None, checksum=True, buffer_size=1048576):
+        """
+        Download the query's results to a local file, as they are streamed by DSS, without decoding the rows
+
+        Args:
+            path: the path of the file to write
+            format: the format in which DSS streams the results, for example "tsv-excel-header" or "csv-excel-header"
+            compression: (optional) "gzip" to compress the file on the fly
+            checksum: whether to compute the SHA-256 of the file
+            buffer_size: the size in bytes of the reads and writes
+
+        Returns:
+            a dict with the number of bytes read ("bytesRead") and written ("bytesWritten"), and the hex SHA-256 of the file ("sha256")
+        """
+        stream = self.client._perform_raw(
+                "GET", "/sql/queries/%s/stream" % (self.queryId),
+                params = {
+                    "format" : format
+                })
+        with closing(stream) as r:
+            r.raw.decode_content = True
+            with open(path, "wb") as f:
+                return dku_copy_stream_to_file(r.raw, f, buffer_size=buffer_size, compression=compression, checksum=checksum)
 
     def verify(self):
         """
@@ -62,8 +95,14 @@ class DSSSQLQuery(object):
         
         Raises:
             if the query failed at some point while streaming the results, an exception will be raised.
-            If the call completes without exception, then the query was successfully streamed
+            If the call completes without exception, then the query was successfully streamed.
+            With prefetching, an exception is also raised if the background download failed or was cancelled
         """
+        if self.reader is not None:
+            if self.reader.error is not None:
+                raise DataikuException("Streaming of the query results failed: %s" % self.reader.error)
+            if self.reader.cancelled:
+                raise DataikuException("Streaming of the query results was cancelled, the results are truncated")
         resp = self.client._perform_empty(
                 "GET", "/sql/queries/%s/finish-streaming" % (self.queryId))
         # exception raising is done in _perform_empty()
\ No newline at end of file
@@ -1,6 +1,8 @@
 from .discussion import DSSObjectDiscussions
-from dataikuapi.utils import DataikuException
+from dataikuapi.utils import DataikuException, dku_parallel_imap, dku_basestring_type
 import json
+import os
+import os.path as osp
 import sys
 import copy
 import re
@@ -42,27 +44,77 @@ class DSSWiki(object):
 
     def __flatten_taxonomy__(self, taxonomy):
         """
-        Private recursive method to get the flatten list of article IDs from the taxonomy
+        Private method to get the flatten list of article IDs from the taxonomy, in depth-first order.
+        It does not recurse, so that deep taxonomies don't hit the recursion limit
 
         :param list taxonomy:
         :returns: list of articles
         :rtype: list of :class:`dataikuapi.dss.wiki.DSSWikiArticle`
         """
         article_list = []
-        for article in taxonomy:
+        stack = [iter(taxonomy)]
+        while len(stack) > 0:
+            article = next(stack[-1], None)
+            if article is None:
+                stack.pop()
+                continue
             article_list.append(self.get_article(article['id']))
-            article_list += self.__flatten_taxonomy__(article['children'])
+            stack.append(iter(article['children']))
         return article_list
 
     def list_articles(self):
         """
-        Get a list of all the articles in form of :class:`dataikuapi.dss.wiki.DSSWikiArticle` objects
+        Get a list of all the articles in form of :class:`dataikuapi.dss.wiki.DSSWikiArticle` objects.
+        This makes a single call: the handles only fetch the article data when it is accessed
 
         :returns: list of articles
         :rtype: list of :class:`dataikuapi.dss.wiki.DSSWikiArticle`
         """
         return self.__flatten_taxonomy__(self.get_settings().get_taxonomy())
 
+    def iter_article_data(self, parallelism=8, article_ids=None, retries=1):
+        """
+        Fetch the data of many articles concurrently, and yield it as soon as it is available, in no particular order
+
+        :param int parallelism: the maximum number of concurrent calls
+        :param list article_ids: (optional) the IDs of the articles. If None, all the articles of the wiki
+        :param int retries: the number of times a failed fetch is retried
+        :returns: a generator over the article data handles
+        :rtype: generator of :class:`dataikuapi.dss.wiki.DSSWikiArticleData`
+        """
+        articles = [self.get_article(article_id) for article_id in article_ids] if article_ids is not None else self.list_articles()
+        self.client._ensure_connection_pool_size(parallelism)
+        for (article, article_data, error) in dku_parallel_imap(lambda a: a.get_data(), articles, parallelism=parallelism, retries=retries):
+            if error is not None:
+                raise error
+            yield article_data
+
+    def export_articles(self, target, parallelism=8):
+        """
+        Export all the articles of the wiki, fetched concurrently
+
+        :param target: the path of a directory in which to write the articles, or a sink like
+                       :class:`dataikuapi.dss.wiki.DSSWikiDirectorySink` or :class:`dataikuapi.dss.wiki.DSSWikiJSONLSink`,
+                       which is left open
+        :param int parallelism: the maximum number of concurrent calls
+        :returns: the number of exported articles
+        :rtype: int
+        """
+        if not isinstance(target, dku_basestring_type):
+            return self._export_articles_to_sink(target, parallelism)
+        sink = DSSWikiDirectorySink(target)
+        try:
+            return self._export_articles_to_sink(sink, parallelism)
+        finally:
+            sink.close()
+
+    def _export_articles_to_sink(self, sink, parallelism):
+        count = 0
+        for article_data in self.iter_article_data(parallelism=parallelism):
+            sink.add(article_data.to_record())
+            count += 1
+        return count
+
     def create_article(self, article_id, parent_id=None, content=None):
         """
         Create a wiki article
@@ -98,6 +150,10 @@ class DSSWikiSettings(object):
         self.client = client
         self.project_key = project_key
         self.settings = settings
+        # index of the taxonomy nodes, their parent and their position among their siblings, built on first use
+        self._nodes = None
+        self._parents = None
+        self._positions = None
 
     def get_taxonomy(self):
         """
@@ -125,28 +181,101 @@ class DSSWikiSettings(object):
         :returns: The taxonomy
         :rtype: list
         """
+        # the caller may modify the taxonomy
+        self._invalidate_index()
         return self.settings["taxonomy"]
 
-    def __retrieve_article_in_taxonomy__(self, taxonomy, article_id, remove=False):
+    def _invalidate_index(self):
+        self._nodes = None
+        self._parents = None
+        self._positions = None
+
+    def _build_index(self):
+        if self._nodes is not None:
+            return
+        self._nodes = {}
+        self._parents = {}
+        self._positions = {}
+        stack = [(None, self.settings["taxonomy"])]
+        while len(stack) > 0:
+            (parent_id, siblings) = stack.pop()
+            for (i, node) in enumerate(siblings):
+                self._nodes[node["id"]] = node
+                self._parents[node["id"]] = parent_id
+                self._positions[node["id"]] = i
+                stack.append((node["id"], node["children"]))
+
+    def _get_siblings(self, parent_id):
+        return self.settings["taxonomy"] if parent_id is None else self._nodes[parent_id]["children"]
+
+    def _get_position(self, article_id):
+        # positions are renumbered lazily, when removals have shifted them
+        siblings = self._get_siblings(self._parents[article_id])
+        node = self._nodes[article_id]
+        i = self._positions.get(article_id, -1)
+        if i < 0 or i >= len(siblings) or siblings[i] is not node:
+            for (j, sibling) in enumerate(siblings):
+                self._positions[sibling["id"]] = j
+            i = self._positions.get(article_id, -1)
+            if i < 0 or i >= len(siblings) or siblings[i] is not node:
+                return -1
+        return i
+
+    def _check_index(self, article_ids):
+        """
+        Checks the index against the taxonomy on the paths from the articles to the root level, and rebuilds it if they
+        differ, ie. if the taxonomy was modified since, through a reference returned by :meth:`get_taxonomy`
+        """
+        self._build_index()
+        for article_id in article_ids:
+            if article_id is None:
+                continue
+            stale = article_id not in self._nodes
+            ancestor_id = article_id
+            while not stale and ancestor_id is not None:
+                stale = self._get_position(ancestor_id) < 0
+                ancestor_id = self._parents[ancestor_id]
+            if stale:
+                self._invalidate_index()
+                self._build_index()
+                return
+
+    def has_article(self, article_id):
+        """
+        Whether an article is in the taxonomy
+
+        :param str article_id: the article ID
+        :rtype: bool
         """
-        Private recusive method that get the sub tree structure from the taxonomy for a specific article
+        self._check_index([article_id])
+        return article_id in self._nodes
 
-        :param list taxonomy: the current level of taxonomy
-        :param str article_id: the article to retrieve
-        :param bool remove: either remove the sub tree structure or not
-        :returns: the sub tree structure at a specific article level
-        :rtype: dict
+    def get_parent_article_id(self, article_id):
+        """
+        Get the ID of the parent of an article in the taxonomy
+
+        :param str article_id: the article ID
+        :returns: the parent article ID, or None for a root level article
+        :rtype: str
+        """
+        self._check_index([article_id])
+        if article_id not in self._nodes:
+            raise DataikuException("Article not found: %s" % (article_id))
+        return self._parents[article_id]
+
+    def get_article_ancestors(self, article_id):
         """
-        idx = 0
-        for tax_article in taxonomy:
-            if tax_article["id"] == article_id:
-                ret = taxonomy.pop(idx) if remove else taxonomy[idx]
-                return ret
-            children_ret = self.__retrieve_article_in_taxonomy__(tax_article["children"], article_id, remove)
-            if children_ret is not None:
-                return children_ret
-            idx += 1
-        return None
+        Get the IDs of the ancestors of an article in the taxonomy, from its parent to the root level
+
+        :param str article_id: the article ID
+        :rtype: list of str
+        """
+        ancestors = []
+        parent_id = self.get_parent_article_id(article_id)
+        while parent_id is not None:
+            ancestors.append(parent_id)
+            parent_id = self._parents[parent_id]
+        return ancestors
 
     def move_article_in_taxonomy(self, article_id, parent_article_id=None):
         """
@@ -155,21 +284,41 @@ class DSSWikiSettings(object):
         :param str article_id: the main article ID
         :param str parent_article_id: the new parent article ID or None for root level
         """
-        old_taxonomy = copy.deepcopy(self.settings["taxonomy"])
-
-        tax_article = self.__retrieve_article_in_taxonomy__(self.settings["taxonomy"], article_id, True)
-        if tax_article is None:
+        self._check_index([article_id, parent_article_id])
+        if article_id not in self._nodes:
             raise DataikuException("Article not found: %s" % (article_id))
-
-        if parent_article_id is None:
-            self.settings["taxonomy"].append(tax_article)
-        else:
-            tax_parent_article = self.__retrieve_article_in_taxonomy__(self.settings["taxonomy"], parent_article_id, False)
-            if tax_parent_article is None:
-                self.settings["taxonomy"] = old_taxonomy
+        if parent_article_id is not None:
+            ancestor_id = parent_article_id if parent_article_id in self._nodes else article_id
+            while ancestor_id is not None and ancestor_id != article_id:
+                ancestor_id = self._parents[ancestor_id]
+            if ancestor_id == article_id:
                 raise DataikuException("Parent article not found (or is one of the article descendants): %s" % (parent_article_id))
-            tax_parent_article["children"].append(tax_article)
 
+        node = self._nodes[article_id]
+        self._get_siblings(self._parents[article_id]).pop(self._get_position(article_id))
+        siblings = self._get_siblings(parent_article_id)
+        siblings.append(node)
+        self._parents[article_id] = parent_article_id
+        self._positions[article_id] = len(siblings) - 1
+
+    def move_articles_in_taxonomy(self, moves):
+        """
+        Move many articles at once, see :meth:`move_article_in_taxonomy`. The moves are applied in order. If one of them
+        fails, the taxonomy is left unchanged
+
+        :param moves: a list of (article ID, new parent article ID or None for root level) pairs, or a dict of article ID to
+                      new parent article ID
+        """
+        if isinstance(moves, dict):
+            moves = list(moves.items())
+        old_taxonomy = copy.deepcopy(self.settings["taxonomy"])
+        try:
+            for (article_id, parent_article_id) in moves:
+                self.move_article_in_taxonomy(article_id, parent_article_id)
+        except:
+            self.settings["taxonomy"] = old_taxonomy
+            self._invalidate_index()
+            raise
 
     def set_taxonomy(self, taxonomy):
         """
@@ -178,6 +327,7 @@ class DSSWikiSettings(object):
         :param list taxonomy: the taxonomy
         """
         self.settings["taxonomy"] = taxonomy
+        self._invalidate_index()
 
     def get_home_article_id(self):
         """
@@ -201,6 +351,7 @@ class DSSWikiSettings(object):
         Save the current settings to the backend
         """
         self.settings = self.client._perform_json("PUT", "/projects/%s/wiki/" % (self.project_key), body=self.settings)
+        self._invalidate_index()
 
 class DSSWikiArticle(object):
     """
@@ -303,3 +454,49 @@ class DSSWikiArticleData(object):
         Save the current article data to the backend
         """
         self.article_data = self.client._perform_json("PUT", "/projects/%s/wiki/%s" % (self.project_key, dku_quote_fn(self.article_id)), body=self.article_data)
+
+    def to_record(self):
+        """
+        Get the article as a dict with the project key ("projectKey"), the article ID ("id"), the metadata ("article")
+        and the markdown body ("payload")
+
+        :rtype: dict
+        """
+        return {"projectKey" : self.project_key, "id" : self.article_id,
+                "article" : self.article_data.get("article", None), "payload" : self.article_data.get("payload", None)}
+
+
+class DSSWikiDirectorySink(object):
+    """
+    Writes exported wiki articles to a local directory: the markdown body of each article to a .md file and its
+    metadata to a .json file, named after the article ID
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not osp.isdir(directory):
+            os.makedirs(directory)
+
+    def add(self, record):
+        name = dku_quote_fn(record["id"], safe="")
+        with open(osp.join(self.directory, name + ".md"), "wb") as f:
+            f.write((record["payload"] or "").encode("utf-8"))
+        with open(osp.join(self.directory, name + ".json"), "w") as f:
+            json.dump(record["article"], f, indent=2)
+
+    def close(self):
+        pass
+
+
+class DSSWikiJSONLSink(object):
+    """
+    Writes exported wiki articles to a file, one JSON record per article and per line
+    """
+    def __init__(self, path):
+        self.f = open(path, "w")
+
+    def add(self, record):
+        self.f.write(json.dumps(record))
+        self.f.write("\n")
+
+    def close(self):
+        self.f.close()
@@ -1,6 +1,10 @@
+import hashlib
 import json
+import time
 from requests import Session
+from requests.adapters import HTTPAdapter
 from requests import exceptions
+from requests.packages.urllib3 import exceptions as urllib3_exceptions
 from requests.auth import HTTPBasicAuth
 
 from .dss.future import DSSFuture
@@ -12,10 +16,16 @@ from .dss.sqlquery import DSSSQLQuery
 from .dss.notebook import DSSNotebook
 from .dss.discussion import DSSObjectDiscussions
 from .dss.apideployer import DSSAPIDeployer
+from .dss.inventory import DSSProjectsInventoryCrawler, DSSInventoryIndex
+from .dss.backup import DSSProjectsExporter, DSSExportDirectorySink
+from .dss.search import DSSContentSearchIndex, DSSContentSearchCrawler
 import os.path as osp
-from .utils import DataikuException
+from .utils import DataikuException, dku_gzip_compress, dku_basestring_type, dku_iter_stream_chunks
+from .base_client import DSSClientOptionsMixin
+from .cache import DSSResponseCache, DSSConditionalRequestsCache
+from .instrumentation import fire_request_hooks
 
-class DSSClient(object):
+class DSSClient(DSSClientOptionsMixin):
     """Entry point for the DSS API client"""
 
     def __init__(self, host, api_key=None, internal_ticket = None):
@@ -30,6 +40,9 @@ class DSSClient(object):
         self.internal_ticket = internal_ticket
         self.host = host
         self._session = Session()
+        self._response_cache = None
+        self._conditional_requests_cache = None
+        self._init_client_options()
 
         if self.api_key is not None:
             self._session.auth = HTTPBasicAuth(self.api_key, "")
@@ -157,6 +170,71 @@ class DSSClient(object):
                })
         return DSSProject(self, project_key)
 
+    def crawl_projects_inventory(self, sink=None, previous=None, project_keys=None, parallelism=8, max_requests_per_second=None):
+        """
+        Crawls the datasets, recipes, scenarios, saved models and metadata of the projects concurrently, and
+        stores the inventory record of each project in a sink as soon as it is complete.
+
+        For more control, or to iterate on the records as they arrive, use a
+        :class:`dataikuapi.dss.inventory.DSSProjectsInventoryCrawler`
+
+        :param sink: (optional) where to store the records: a :class:`dataikuapi.dss.inventory.DSSInventoryIndex`,
+                     :class:`dataikuapi.dss.inventory.DSSInventoryJSONLSink` or :class:`dataikuapi.dss.inventory.DSSInventorySQLiteSink`.
+                     Defaults to a new in-memory index
+        :param previous: (optional) a :class:`dataikuapi.dss.inventory.DSSInventoryIndex` from a previous crawl. Projects
+                         that did not change since then are not crawled again
+        :param list project_keys: (optional) the keys of the projects to crawl. If None, all projects are crawled
+        :param int parallelism: the maximum number of concurrent calls
+        :param float max_requests_per_second: (optional) the maximum number of calls started per second
+        :returns: the sink. A sink passed as argument is not closed, so that it can still be used, for example to
+                  load the index of a SQLite sink for the next crawl: close it when done
+        """
+        if sink is None:
+            sink = DSSInventoryIndex()
+        crawler = DSSProjectsInventoryCrawler(self, parallelism=parallelism, max_requests_per_second=max_requests_per_second)
+        for record in crawler.crawl(project_keys=project_keys, previous=previous):
+            sink.add(record)
+        return sink
+
+    def export_projects(self, target, project_keys=None, parallelism=4, retries=2, options=None, skip_unchanged=True):
+        """
+        Exports projects concurrently, for example for backups, and writes a manifest with the size, duration and
+        checksum of each export.
+
+        For more control, use a :class:`dataikuapi.dss.backup.DSSProjectsExporter`
+
+        :param target: the path of the directory in which to write the exports, or a sink like
+                       :class:`dataikuapi.dss.backup.DSSExportDirectorySink`
+        :param list project_keys: (optional) the keys of the projects to export. If None, all projects are exported
+        :param int parallelism: the maximum number of concurrent exports
+        :param int retries: the number of times a failed export is retried
+        :param dict options: (optional) the export options, as for :meth:`dataikuapi.dss.project.DSSProject.export_to_file`
+        :param bool skip_unchanged: whether to skip the projects whose version tag did not change since the previous
+                                    export to the same target
+        :returns: the manifest, as a dict. See :meth:`dataikuapi.dss.backup.DSSProjectsExporter.export`
+        """
+        sink = DSSExportDirectorySink(target) if isinstance(target, dku_basestring_type) else target
+        exporter = DSSProjectsExporter(self, parallelism=parallelism, retries=retries, options=options)
+        return exporter.export(sink, project_keys=project_keys, skip_unchanged=skip_unchanged)
+
+    def update_content_search_index(self, target, project_keys=None, parallelism=8):
+        """
+        Crawls the wiki articles and discussions of the projects concurrently, and updates a local full-text index
+        of them. Only the discussions with new replies since the previous update of the same index are fetched again,
+        and only the modified articles are re-indexed.
+
+        For more control, use a :class:`dataikuapi.dss.search.DSSContentSearchCrawler`
+
+        :param target: the path of the SQLite database of the index, or a :class:`dataikuapi.dss.search.DSSContentSearchIndex`
+        :param list project_keys: (optional) the keys of the projects to crawl. If None, all projects are crawled
+        :param int parallelism: the maximum number of concurrent calls
+        :returns: the index, to search with :meth:`dataikuapi.dss.search.DSSContentSearchIndex.search`
+        :rtype: :class:`dataikuapi.dss.search.DSSContentSearchIndex`
+        """
+        index = DSSContentSearchIndex(target) if isinstance(target, dku_basestring_type) else target
+        DSSContentSearchCrawler(self, parallelism=parallelism).crawl(index, project_keys=project_keys)
+        return index
+
     ########################################################
     # Plugins
     ########################################################
@@ -706,22 +784,96 @@ class DSSClient(object):
             "indexingMode": indexing_mode
         })
 
+    ########################################################
+    # Response cache
+    ########################################################
+
+    def enable_response_cache(self, ttls=None, default_ttl=0, max_entries=1000):
+        """
+        Enables caching of the responses of read-mostly GET calls made by this client, such as
+        :meth:`list_connections`, :meth:`list_users`, :meth:`list_groups`, :meth:`list_code_envs`,
+        :meth:`list_meanings`, :meth:`list_plugins`, :meth:`dataikuapi.dss.project.DSSProject.list_datasets`
+        or :meth:`dataikuapi.dss.dataset.DSSDataset.get_schema`.
+
+        A cached response is dropped when it expires, when the cache is full and it is the least recently used one,
+        or when this client issues a PUT, POST or DELETE on the same resource path. Changes made to DSS by
+        other clients are only seen once the cached response expires.
+
+        :param dict ttls: (optional) time-to-live in seconds of the responses of endpoints, as a dict of path pattern
+                          (for example "/projects/*/recipes/") to seconds. Overrides the defaults of
+                          :attr:`dataikuapi.cache.DSSResponseCache.DEFAULT_TTLS`. A time-to-live of 0 disables caching
+        :param int default_ttl: time-to-live in seconds of the responses of the other GET endpoints. Defaults to 0 (not cached)
+        :param int max_entries: the maximum number of cached responses
+        """
+        self._response_cache = DSSResponseCache(ttls=ttls, default_ttl=default_ttl, max_entries=max_entries)
+
+    def disable_response_cache(self):
+        """
+        Disables the response cache enabled by :meth:`enable_response_cache`, and drops all cached responses
+        """
+        self._response_cache = None
+
+    def clear_response_cache(self):
+        """
+        Drops all responses cached since :meth:`enable_response_cache` was called
+        """
+        if self._response_cache is not None:
+            self._response_cache.clear()
+
+    ########################################################
+    # Conditional requests
+    ########################################################
+
+    def enable_conditional_requests(self, max_entries=1000):
+        """
+        Enables conditional GET requests for the JSON resources read by this client.
+
+        The ETag and Last-Modified validators and the body of responses are remembered, and sent back
+        in the If-None-Match and If-Modified-Since headers of the next identical call. When DSS answers that
+        the resource did not change, the remembered body is returned without being transferred and decoded
+        again. This mostly helps when polling large resources, like project settings or ML task statuses.
+
+        Unlike :meth:`enable_response_cache`, every call still reaches DSS, so the returned data is never stale.
+
+        :param int max_entries: the maximum number of remembered responses
+        """
+        self._conditional_requests_cache = DSSConditionalRequestsCache(max_entries=max_entries)
+
+    def disable_conditional_requests(self):
+        """
+        Disables the conditional requests enabled by :meth:`enable_conditional_requests`
+        """
+        self._conditional_requests_cache = None
+
     ########################################################
     # Internal Request handling
     ########################################################
 
-    def _perform_http(self, method, path, params=None, body=None, stream=False, files=None, raw_body=None):
+    def _perform_http(self, method, path, params=None, body=None, stream=False, files=None, raw_body=None, headers=None):
+        if self._response_cache is not None and method != "GET":
+            self._response_cache.invalidate(path)
         if body is not None:
-            body = json.dumps(body)
+            body = self._json_codec.dumps(body)
         if raw_body is not None:
             body = raw_body
-
+        if self._request_compression is not None and isinstance(body, bytes) and len(body) >= self._request_compression[0]:
+            body = dku_gzip_compress(body, self._request_compression[1])
+            headers = dict(headers) if headers is not None else {}
+            headers["Content-Encoding"] = "gzip"
+
+        url = "%s/dip/publicapi%s" % (self.host, path)
+        span = None
+        if self._tracing is not None:
+            (span, headers) = self._tracing.start_request_span(method, path, url, headers)
+        start = time.time()
+        http_res = None
         try:
             http_res = self._session.request(
-                    method, "%s/dip/publicapi%s" % (self.host, path),
+                    method, url,
                     params=params, data=body,
                     files = files,
-                    stream = stream)
+                    stream = stream,
+                    headers = headers)
             http_res.raise_for_status()
             return http_res
         except exceptions.HTTPError:
@@ -730,29 +882,141 @@ class DSSClient(object):
             except ValueError:
                 ex = {"message": http_res.text}
             raise DataikuException("%s: %s" % (ex.get("errorType", "Unknown error"), ex.get("message", "No message")))
-
-    def _perform_empty(self, method, path, params=None, body=None, files = None, raw_body=None):
-        self._perform_http(method, path, params=params, body=body, files=files, stream=False, raw_body=raw_body)
+        finally:
+            # a GET made concurrently with the write may have cached what the write is replacing
+            if self._response_cache is not None and method != "GET":
+                self._response_cache.invalidate(path)
+            if span is not None:
+                self._tracing.end_request_span(span, http_res)
+            if len(self._request_hooks) > 0:
+                fire_request_hooks(self._request_hooks, method, path, http_res, start, stream)
+
+    def _ensure_connection_pool_size(self, size):
+        """Makes the session keep up to ``size`` connections to the host open, for concurrent calls"""
+        adapter = self._session.get_adapter(self.host)
+        if isinstance(adapter, HTTPAdapter) and getattr(adapter, "_pool_maxsize", 0) < size:
+            adapter = HTTPAdapter(pool_maxsize=size, max_retries=adapter.max_retries)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+
+    def _perform_empty(self, method, path, params=None, body=None, files = None, raw_body=None, headers=None):
+        self._perform_http(method, path, params=params, body=body, files=files, stream=False, raw_body=raw_body, headers=headers)
 
     def _perform_text(self, method, path, params=None, body=None,files=None, raw_body=None):
         return self._perform_http(method, path, params=params, body=body, files=files, stream=False, raw_body=raw_body).text
 
     def _perform_json(self, method, path, params=None, body=None,files=None, raw_body=None):
-        return self._perform_http(method, path,  params=params, body=body, files=files, stream=False, raw_body=raw_body).json()
-
-    def _perform_raw(self, method, path, params=None, body=None,files=None, raw_body=None):
-        return self._perform_http(method, path, params=params, body=body, files=files, stream=True, raw_body=raw_body)
+        if method == "GET" and files is None and raw_body is None:
+            if self._response_cache is not None:
+                return self._response_cache.fetch(path, params, body,
+                        lambda: self._perform_json_get(path, params, body))
+            return self._perform_json_get(path, params, body)
+        return self._json_codec.loads(self._perform_http(method, path,  params=params, body=body, files=files, stream=False, raw_body=raw_body).content)
+
+    def _perform_json_get(self, path, params, body):
+        if self._conditional_requests_cache is not None:
+            return self._conditional_requests_cache.fetch(path, params, body,
+                    lambda headers: self._perform_http("GET", path, params=params, body=body, stream=False, headers=headers),
+                    self._json_codec.loads)
+        return self._json_codec.loads(self._perform_http("GET", path, params=params, body=body, stream=False).content)
+
+    def _perform_raw(self, method, path, params=None, body=None,files=None, raw_body=None, headers=None):
+        return self._perform_http(method, path, params=params, body=body, files=files, stream=True, raw_body=raw_body, headers=headers)
+
+    def _download_to_file(self, method, path, f, params=None, body=None, buffer_size=8388608, retries=3, retry_delay=5,
+                          progress_callback=None, checksum=True):
+        """
+        Downloads the response of a call to a file, through a preallocated buffer. When the transfer fails, it is resumed
+        with a range request if DSS advertised range support and a validator (ETag or Last-Modified) for the response,
+        and restarted from the beginning otherwise. The If-Range validator makes DSS send the whole response again
+        instead of a range of a different one, for example when a new export was built for the retried call.
+        """
+        sha = hashlib.sha256() if checksum else None
+        buf = bytearray(buffer_size)
+        written = 0
+        total = None
+        validator = None
+        attempt = 0
+        resumed = 0
+        while True:
+            headers = {"Range" : "bytes=%d-" % written, "If-Range" : validator} if validator is not None and written > 0 else None
+            try:
+                http_res = self._perform_raw(method, path, params=params, body=body, headers=headers)
+                try:
+                    if headers is not None and http_res.status_code == 206:
+                        if not http_res.headers.get("Content-Range", "").startswith("bytes %d-" % written):
+                            validator = None
+                            raise IOError("Unexpected range %s in the response to %s" % (http_res.headers.get("Content-Range", None), path))
+                        resumed += 1
+                    else:
+                        if written > 0:
+                            # the range was not honored, restart from the beginning
+                            f.seek(0)
+                            f.truncate()
+                            written = 0
+                            sha = hashlib.sha256() if checksum else None
+                        encoded = http_res.headers.get("Content-Encoding", None) is not None
+                        validator = None
+                        # ranges are offsets in the encoded response, while the decoded bytes are counted
+                        if http_res.headers.get("Accept-Ranges", "none") == "bytes" and not encoded:
+                            etag = http_res.headers.get("ETag", None)
+                            # If-Range requires a strong validator
+                            validator = etag if etag is not None and not etag.startswith("W/") else http_res.headers.get("Last-Modified", None)
+                        length = http_res.headers.get("Content-Length", None)
+                        total = int(length) if length is not None and not encoded else None
+                    http_res.raw.decode_content = True
+                    for chunk in dku_iter_stream_chunks(http_res.raw, buf):
+                        f.write(chunk)
+                        if sha is not None:
+                            sha.update(chunk)
+                        written += len(chunk)
+                        if progress_callback is not None:
+                            progress_callback(written, total)
+                finally:
+                    http_res.close()
+                if total is not None and written < total:
+                    raise IOError("Download of %s interrupted after %d of %d bytes" % (path, written, total))
+                break
+            except (exceptions.RequestException, urllib3_exceptions.HTTPError, IOError) as e:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                time.sleep(retry_delay)
+        f.flush()
+        return {
+            "bytesWritten" : written,
+            "sha256" : sha.hexdigest() if sha is not None else None,
+            "retries" : attempt,
+            "resumed" : resumed
+        }
 
     def _perform_json_upload(self, method, path, name, f):
+        if self._response_cache is not None:
+            self._response_cache.invalidate(path)
+        url = "%s/dip/publicapi%s" % (self.host, path)
+        span = None
+        headers = None
+        if self._tracing is not None:
+            (span, headers) = self._tracing.start_request_span(method, path, url, headers)
+        start = time.time()
+        http_res = None
         try:
             http_res = self._session.request(
-                    method, "%s/dip/publicapi%s" % (self.host, path),
-                    files = {'file': (name, f, {'Expires': '0'})} )
+                    method, url,
+                    files = {'file': (name, f, {'Expires': '0'})},
+                    headers = headers)
             http_res.raise_for_status()
             return http_res
         except exceptions.HTTPError:
             ex = http_res.json()
             raise DataikuException("%s: %s" % (ex.get("errorType", "Unknown error"), ex.get("message", "No message")))
+        finally:
+            if self._response_cache is not None:
+                self._response_cache.invalidate(path)
+            if span is not None:
+                self._tracing.end_request_span(span, http_res)
+            if len(self._request_hooks) > 0:
+                fire_request_hooks(self._request_hooks, method, path, http_res, start, False)
 
     ########################################################
     # Discussions
@@ -0,0 +1,190 @@
+import threading
+import time
+
+# placeholders for the identifiers that follow a collection in a request path
+_PATH_COLLECTIONS = {
+    "projects" : ["{projectKey}"],
+    "datasets" : ["{datasetName}"],
+    "recipes" : ["{recipeName}"],
+    "managedfolders" : ["{folderId}"],
+    "savedmodels" : ["{savedModelId}"],
+    "versions" : ["{versionId}"],
+    "scenarios" : ["{scenarioId}"],
+    "jobs" : ["{jobId}"],
+    "futures" : ["{jobId}"],
+    "users" : ["{login}"],
+    "groups" : ["{groupName}"],
+    "connections" : ["{connectionName}"],
+    "code-envs" : ["{envLang}", "{envName}"],
+    "clusters" : ["{clusterId}"],
+    "globalAPIKeys" : ["{apiKey}"],
+    "logs" : ["{logName}"],
+    "plugins" : ["{pluginId}"],
+    "meanings" : ["{meaningId}"],
+    "lab" : ["{analysisId}", "{mlTaskId}"],
+    "models" : ["{modelId}"],
+    "apiservices" : ["{serviceId}"],
+    "services" : ["{serviceId}"],
+    "deployments" : ["{deploymentId}"],
+    "infras" : ["{infraId}"],
+    "exported" : ["{bundleId}"],
+    "imported" : ["{bundleId}"],
+    "runnables" : ["{runnableType}"],
+    "queries" : ["{queryId}"],
+    "wiki" : ["{articleId}"],
+    "discussions" : ["{objectType}", "{objectId}", "{discussionId}"],
+    "history" : ["{partition}"],
+    "last" : ["{partition}"]
+}
+
+# segments that follow a collection but are not identifiers
+_PATH_KEYWORDS = set(["lab", "actions", "trigger"])
+
+def template_path(path):
+    """
+    Replaces the identifiers in a request path by placeholders, for example
+    "/projects/MYPROJECT/datasets/mydataset/schema" becomes "/projects/{projectKey}/datasets/{datasetName}/schema"
+    """
+    segments = path.split("/")
+    templated = []
+    i = 0
+    while i < len(segments):
+        segment = segments[i]
+        templated.append(segment)
+        i += 1
+        if segment == "contents" and i < len(segments) and segments[i] != "":
+            # managed folder contents: the rest of the path is a file path
+            templated.append("{path}")
+            break
+        for placeholder in _PATH_COLLECTIONS.get(segment, []):
+            if i >= len(segments) or segments[i] == "" or segments[i] in _PATH_KEYWORDS:
+                break
+            templated.append(placeholder)
+            i += 1
+    return "/".join(templated)
+
+
+class DSSRequestEvent(object):
+    """
+    The description of an HTTP call performed by a client, passed to request hooks
+
+    * ``method``: the HTTP method
+    * ``path``: the path of the call
+    * ``path_template``: the path, with identifiers replaced by placeholders
+    * ``status``: the HTTP status code, or None if no response was received
+    * ``bytes_sent``: the size of the request body
+    * ``bytes_received``: the size of the response body. For streamed responses, the announced Content-Length (or None)
+    * ``time_to_first_byte``: the time in seconds until the response headers were received
+    * ``total_time``: the time in seconds until the response was complete. For streamed responses,
+      the body is not read yet, so this is only the time until the stream was ready
+    """
+    def __init__(self, method, path, status, bytes_sent, bytes_received, time_to_first_byte, total_time):
+        self.method = method
+        self.path = path
+        self.path_template = template_path(path)
+        self.status = status
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.time_to_first_byte = time_to_first_byte
+        self.total_time = total_time
+
+    def is_error(self):
+        """Whether the call failed, either without a response or with an HTTP error status"""
+        return self.status is None or self.status >= 400
+
+
+def fire_request_hooks(hooks, method, path, http_res, start, stream):
+    """Builds the event describing a call and passes it to each of the request hooks"""
+    total_time = time.time() - start
+    if http_res is None:
+        event = DSSRequestEvent(method, path, None, 0, 0, None, total_time)
+    else:
+        sent = http_res.request.headers.get("Content-Length", None) if http_res.request is not None else None
+        if stream:
+            received = http_res.headers.get("Content-Length", None)
+            received = int(received) if received is not None else None
+        else:
+            received = len(http_res.content)
+        event = DSSRequestEvent(method, path, http_res.status_code, int(sent) if sent is not None else 0,
+                                received, http_res.elapsed.total_seconds(), total_time)
+    for hook in hooks:
+        hook(event)
+
+
+class DSSRequestMetrics(object):
+    """
+    A request hook that aggregates counters and latency histograms per HTTP method and templated path.
+
+    Register it on a client with ``client.add_request_hook(metrics)``
+    """
+
+    DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    def __init__(self, buckets=None):
+        self.buckets = sorted(buckets) if buckets is not None else DSSRequestMetrics.DEFAULT_BUCKETS
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.method, event.path_template)
+        with self.lock:
+            stats = self.endpoints.get(key, None)
+            if stats is None:
+                stats = {"count" : 0, "errors" : 0, "bytesSent" : 0, "bytesReceived" : 0, "totalTime" : 0.0,
+                         "timeToFirstByte" : 0.0, "maxTime" : 0.0, "buckets" : [0] * len(self.buckets)}
+                self.endpoints[key] = stats
+            stats["count"] += 1
+            if event.is_error():
+                stats["errors"] += 1
+            stats["bytesSent"] += event.bytes_sent
+            stats["bytesReceived"] += event.bytes_received or 0
+            stats["totalTime"] += event.total_time
+            stats["timeToFirstByte"] += event.time_to_first_byte or 0.0
+            stats["maxTime"] = max(stats["maxTime"], event.total_time)
+            for i in range(len(self.buckets)):
+                if event.total_time <= self.buckets[i]:
+                    stats["buckets"][i] += 1
+
+    def reset(self):
+        """Forgets all aggregated calls"""
+        with self.lock:
+            self.endpoints = {}
+
+    def to_dict(self):
+        """
+        Gets the aggregated metrics, as a dict of "METHOD /path/template" to a dict of metrics. The histogram is in
+        "buckets", as a dict of upper bound (in seconds) to the cumulative number of calls
+        """
+        ret = {}
+        with self.lock:
+            for ((method, path_template), stats) in self.endpoints.items():
+                entry = dict(stats)
+                entry["buckets"] = dict(zip(self.buckets, stats["buckets"]))
+                ret["%s %s" % (method, path_template)] = entry
+        return ret
+
+    def to_prometheus(self, prefix="dss_client"):
+        """Gets the aggregated metrics, in the Prometheus text exposition format"""
+        def labels(method, path_template, extra=""):
+            escaped = path_template.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            return "{method=\"%s\",path=\"%s\"%s}" % (method, escaped, extra)
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+        lines = ["# HELP %s_request_duration_seconds Duration of the HTTP calls to DSS" % prefix,
+                 "# TYPE %s_request_duration_seconds histogram" % prefix]
+        for ((method, path_template), stats) in endpoints:
+            for (bound, count) in zip(self.buckets, stats["buckets"]):
+                lines.append("%s_request_duration_seconds_bucket%s %d" % (prefix, labels(method, path_template, ",le=\"%s\"" % bound), count))
+            lines.append("%s_request_duration_seconds_bucket%s %d" % (prefix, labels(method, path_template, ",le=\"+Inf\""), stats["count"]))
+            lines.append("%s_request_duration_seconds_sum%s %f" % (prefix, labels(method, path_template), stats["totalTime"]))
+            lines.append("%s_request_duration_seconds_count%s %d" % (prefix, labels(method, path_template), stats["count"]))
+        for (name, field, help, fmt) in [("request_errors_total", "errors", "Number of failed HTTP calls to DSS", "%d"),
+                                         ("request_sent_bytes_total", "bytesSent", "Bytes sent in HTTP calls to DSS", "%d"),
+                                         ("request_received_bytes_total", "bytesReceived", "Bytes received in HTTP calls to DSS", "%d"),
+                                         ("request_time_to_first_byte_seconds_total", "timeToFirstByte", "Time to first byte of HTTP calls to DSS", "%f")]:
+            lines.append("# HELP %s_%s %s" % (prefix, name, help))
+            lines.append("# TYPE %s_%s counter" % (prefix, name))
+            for ((method, path_template), stats) in endpoints:
+                lines.append(("%s_%s%s " + fmt) % (prefix, name, labels(method, path_template), stats[field]))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from .instrumentation import template_path
+
+class DSSTracing(object):
+    """
+    Creates an OpenTelemetry span for each HTTP call of a client, and propagates the trace context
+    to DSS in the request headers (W3C ``traceparent`` by default).
+
+    This requires the ``opentelemetry-api`` package. Do not create this class directly, instead use
+    :meth:`dataikuapi.DSSClient.enable_tracing` or :meth:`dataikuapi.APINodeClient.enable_tracing`
+    """
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace, propagate
+        except ImportError:
+            raise ImportError("Tracing requires the opentelemetry-api package")
+        self.trace = trace
+        self.propagate = propagate
+        self.tracer = tracer if tracer is not None else trace.get_tracer("dataikuapi")
+
+    def start_request_span(self, method, path, url, headers):
+        """
+        Starts the span of an HTTP call, child of the current span if any
+
+        :returns: a tuple of the span and of the request headers, with the trace context injected
+        """
+        span = self.tracer.start_span("DSS %s %s" % (method, template_path(path)),
+                                      kind=self.trace.SpanKind.CLIENT,
+                                      attributes={"http.method" : method, "http.url" : url})
+        headers = dict(headers) if headers is not None else {}
+        self.propagate.inject(headers, context=self.trace.set_span_in_context(span))
+        return (span, headers)
+
+    def end_request_span(self, span, http_res):
+        """Ends the span of an HTTP call, given its response (None if it failed without one)"""
+        if http_res is None:
+            span.set_status(self.trace.Status(self.trace.StatusCode.ERROR))
+        else:
+            span.set_attribute("http.status_code", http_res.status_code)
+            if http_res.status_code >= 400:
+                span.set_status(self.trace.Status(self.trace.StatusCode.ERROR))
+        span.end()
+
+
+class _DSSNoSpan(object):
+    """Stands for a span when tracing is not enabled"""
+    def set_attribute(self, key, value):
+        pass
+
+@contextmanager
+def dku_trace_span(client, name, attributes=None):
+    """
+    Wraps a long-running operation of a client, like waiting for a job, in a span. The HTTP calls
+    made meanwhile are children of this span. When tracing is not enabled on the client, the yielded
+    span does nothing.
+    """
+    tracing = getattr(client, "_tracing", None)
+    if tracing is None:
+        yield _DSSNoSpan()
+    else:
+        with tracing.tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
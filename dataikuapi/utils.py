@@ -1,21 +1,79 @@
-import csv, sys
+import csv, gzip, hashlib, io, json, multiprocessing, sys, time, threading, uuid
+from collections import deque
 from dateutil import parser as date_iso_parser
 from contextlib import closing
 
 import itertools
 
 if sys.version_info > (3,0):
+    import queue as dku_queue
     dku_basestring_type = str
     dku_zip_longest = itertools.zip_longest
+    dku_decode_utf8 = lambda x: x if x is None else str(x)
+    dku_text_stream = lambda raw: io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    dku_timer = time.perf_counter
+    dku_chunk_stream = lambda chunk: io.StringIO(chunk.decode("utf-8"), newline="")
 else:
+    import Queue as dku_queue
     dku_basestring_type = basestring
     dku_zip_longest = itertools.izip_longest
+    dku_decode_utf8 = lambda x: unicode(x, "utf8")
+    dku_text_stream = lambda raw: raw
+    dku_timer = time.time
+    dku_chunk_stream = lambda chunk: io.BytesIO(chunk)
 
 
 
 class DataikuException(Exception):
     """Exception launched by the Dataiku API clients when an error occurs"""
 
+class DataikuJSONCodec(object):
+    """
+    Encodes and decodes the JSON bodies of requests and responses. Bodies are encoded to UTF-8 bytes, so
+    that they are sent as is.
+
+    Use :meth:`get` to obtain a codec
+    """
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    @staticmethod
+    def get(name="auto"):
+        """
+        Gets a JSON codec.
+
+        :param str name: "json" for the standard library codec, "orjson" or "ujson" for these (much faster) libraries,
+                         which must then be installed, or "auto" for the fastest installed one
+        :rtype: :class:`DataikuJSONCodec`
+        """
+        if name == "auto":
+            for candidate in ["orjson", "ujson"]:
+                try:
+                    return DataikuJSONCodec.get(candidate)
+                except ImportError:
+                    pass
+            return DataikuJSONCodec.get("json")
+        elif name == "json":
+            return DataikuJSONCodec("json", lambda obj: json.dumps(obj).encode("utf-8"), json.loads)
+        elif name == "orjson":
+            import orjson
+            return DataikuJSONCodec("orjson", lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), orjson.loads)
+        elif name == "ujson":
+            import ujson
+            return DataikuJSONCodec("ujson", lambda obj: ujson.dumps(obj).encode("utf-8"), ujson.loads)
+        else:
+            raise ValueError("Unknown JSON codec: %s" % name)
+
+def dku_import_numpy():
+    """Imports NumPy when a feature needs it, since it is not a dependency of the client"""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("This feature requires the numpy package")
+    return numpy
+
 class DataikuUTF8CSVReader(object):
     """
     A CSV reader which will iterate over lines in the CSV file "f",
@@ -41,47 +99,538 @@ def none_if_throws(f):
     return aux
 
 
+def dku_parse_iso_date(s):
+    if s == "":
+        return None
+    else:
+        return date_iso_parser.parse(s)
+
+def dku_str_to_bool(s):
+    if s is None:
+        return False
+    return s.lower() == "true"
+
+DKU_CSV_CASTERS = {
+    "tinyint" : int,
+    "smallint" : int,
+    "int": int,
+    "bigint": int,
+    "float": float,
+    "double": float,
+    "date": dku_parse_iso_date,
+    "boolean": dku_str_to_bool,
+}
+
+def dku_csv_reader(f):
+    """Creates a csv.reader for the TSV format in which DSS streams data"""
+    return csv.reader(f, delimiter='\t', quotechar='"', doublequote=True)
+
+
+class DataikuStreamProfile(object):
+    """
+    Where a :class:`DataikuStreamedHttpUTF8CSVReader` records how the time of an iteration over rows was spent,
+    when profiling is enabled. Profiling adds some overhead, in particular for the timing of each cast value.
+
+    * ``bytes_read``: the number of (decompressed) bytes read from the response
+    * ``network_time``: the time in seconds spent blocked reading from the socket
+    * ``tokenize_time``: the time in seconds spent splitting the stream in rows of fields, in csv.reader
+    * ``cast_times``: a dict of column type to the time in seconds spent casting the values of the columns of this type
+    * ``consumer_time``: the time in seconds spent outside of the reader, processing the rows
+    * ``total_time``: the time in seconds from the start to the end of the iteration
+    * ``rows``: the number of rows read
+    """
+    def __init__(self, report_to=None):
+        """
+        :param report_to: (optional) a file-like object, for example ``sys.stderr``, on which the summary report
+                          is written at the end of the iteration
+        """
+        self.report_to = report_to
+        self.bytes_read = 0
+        self.network_time = 0.0
+        self.tokenize_time = 0.0
+        self.cast_times = {}
+        self.consumer_time = 0.0
+        self.total_time = 0.0
+        self.rows = 0
+
+    def get_rows_per_second(self):
+        return self.rows / self.total_time if self.total_time > 0 else 0.0
+
+    def to_dict(self):
+        """Gets the recorded timings as a dict"""
+        return {
+            "bytesRead" : self.bytes_read,
+            "networkTime" : self.network_time,
+            "tokenizeTime" : self.tokenize_time,
+            "castTimes" : dict(self.cast_times),
+            "consumerTime" : self.consumer_time,
+            "totalTime" : self.total_time,
+            "rows" : self.rows,
+            "rowsPerSecond" : self.get_rows_per_second()
+        }
+
+    def report(self):
+        """Gets a human-readable summary of the recorded timings"""
+        def line(label, seconds):
+            share = 100.0 * seconds / self.total_time if self.total_time > 0 else 0.0
+            return "  %-22s %10.3f s  %5.1f %%" % (label, seconds, share)
+        lines = ["Read %d rows (%d bytes) in %.3f s: %.0f rows/s, %.2f MB/s" % (self.rows, self.bytes_read, self.total_time,
+                    self.get_rows_per_second(), self.bytes_read / 1e6 / self.total_time if self.total_time > 0 else 0.0),
+                 line("network", self.network_time),
+                 line("tokenization", self.tokenize_time)]
+        for (column_type, seconds) in sorted(self.cast_times.items()):
+            lines.append(line("cast %s" % column_type, seconds))
+        lines.append(line("consumer", self.consumer_time))
+        return "\n".join(lines)
+
+
+class _DataikuTimedRawStream(io.RawIOBase):
+    """Wraps a raw HTTP response to record the time blocked reading it, and the number of bytes read"""
+    def __init__(self, raw, profile):
+        self.raw = raw
+        self.profile = profile
+        # what the raw stream returned beyond the size asked for, which urllib3 < 2 does on content-encoded responses
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if len(self.pending) == 0:
+            before = dku_timer()
+            self.pending = self.raw.read(len(b))
+            self.profile.network_time += dku_timer() - before
+            self.profile.bytes_read += len(self.pending)
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
 class DataikuStreamedHttpUTF8CSVReader(object):
     """
     A CSV reader with a schema
     """
-    def __init__(self, schema, csv_stream):
+    def __init__(self, schema, csv_stream, profile=None, prefetch=0, batch_size=1000):
+        """
+        :param profile: (optional) a :class:`DataikuStreamProfile` in which to record where the time of the
+                        iteration is spent
+        :param int prefetch: if > 0, the stream is read and decoded on a background thread, which keeps up to this
+                             number of batches of rows ahead of the consumer. If 0, rows are decoded on the consumer's thread
+        :param int batch_size: the number of rows in each prefetched batch
+        """
         self.schema = schema
         self.csv_stream = csv_stream
+        self.profile = profile
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        # outcome of a prefetched iteration: the exception that interrupted the reading, and whether
+        # the consumer stopped before the end of the stream
+        self.error = None
+        self.cancelled = False
+        self._cancel = threading.Event()
 
     def iter_rows(self):
-        def decode(x):
-            return unicode(x, "utf8")
-
-        def parse_iso_date(s):
-            if s == "":
-                return None
-            else:
-                return date_iso_parser.parse(s)
-
-        def str_to_bool(s):
-            if s is None:
-                return False
-            return s.lower() == "true"
-
-        CASTERS = {
-            "tinyint" : int,
-            "smallint" : int,
-            "int": int,
-            "bigint": int,
-            "float": float,
-            "double": float,
-            "date": parse_iso_date,
-            "boolean": str_to_bool,
-        }
-        schema = self.schema
+        if self.prefetch > 0:
+            return self._iter_rows_prefetched()
+        if self.profile is not None:
+            return self._iter_rows_profiled()
+
+        return self._iter_rows()
+
+    def cancel(self):
+        """
+        Stops a prefetched iteration: the background thread stops reading and closes the stream.
+        Closing the iterator returned by :meth:`iter_rows` does the same
+        """
+        self._cancel.set()
+
+    def iter_column_batches(self, processes=None, chunk_size=8388608):
+        """
+        Reads the stream in chunks of whole records, decodes the chunks in a pool of processes, and yields
+        the decoded chunks in order, as :class:`DataikuColumnBatch`. Use this to make decoding scale with
+        the number of cores on very large streams.
+
+        :param int processes: the number of decoding processes. Defaults to the number of cores. If 0, chunks are
+                              decoded in the current process
+        :param int chunk_size: the approximate size in bytes of each chunk, and thus of each batch
+
+        As with :meth:`iter_rows`, the fields of a record beyond the schema are ignored: they are read as None
+        by iter_rows, and batches only hold the columns of the schema
+        """
+        names = [col.get("name", None) for col in self.schema]
+        types = [col["type"] for col in self.schema]
+        with closing(self.csv_stream) as r:
+            r.raw.decode_content = True
+            chunks = dku_split_tsv_records(r.raw, chunk_size)
+            if processes == 0:
+                for chunk in chunks:
+                    yield DataikuColumnBatch(names, dku_decode_tsv_chunk(types, chunk))
+                return
+
+            pool = multiprocessing.Pool(processes)
+            try:
+                # bound the number of chunks in flight, so that the stream is not read faster than it is decoded
+                in_flight = deque()
+                max_in_flight = 2 * (processes or multiprocessing.cpu_count())
+                for chunk in chunks:
+                    in_flight.append(pool.apply_async(dku_decode_tsv_chunk, (types, chunk)))
+                    if len(in_flight) >= max_in_flight:
+                        yield DataikuColumnBatch(names, in_flight.popleft().get())
+                while len(in_flight) > 0:
+                    yield DataikuColumnBatch(names, in_flight.popleft().get())
+            finally:
+                pool.terminate()
+                pool.join()
+
+    def _iter_rows_prefetched(self):
+        batches = dku_queue.Queue(self.prefetch)
+        end = object()
+
+        def put(item):
+            # don't block forever on a full queue if the consumer is gone
+            while not self._cancel.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except dku_queue.Full:
+                    pass
+            return False
+
+        def produce():
+            rows = self._iter_rows_profiled() if self.profile is not None else self._iter_rows()
+            try:
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        if not put(batch):
+                            return
+                        batch = []
+                if len(batch) > 0 and not put(batch):
+                    return
+                put(end)
+            except Exception as e:
+                put(e)
+            finally:
+                rows.close()
+
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+        try:
+            while True:
+                if self._cancel.is_set():
+                    self.cancelled = True
+                    return
+                try:
+                    batch = batches.get(timeout=0.1)
+                except dku_queue.Empty:
+                    continue
+                if batch is end:
+                    break
+                if isinstance(batch, Exception):
+                    self.error = batch
+                    raise batch
+                for row in batch:
+                    yield row
+        except GeneratorExit:
+            self.cancelled = True
+            raise
+        finally:
+            self._cancel.set()
+
+    def _iter_rows(self):
         casters = [
-            CASTERS.get(col["type"], decode) for col in schema
+            none_if_throws(DKU_CSV_CASTERS.get(col["type"], dku_decode_utf8)) for col in self.schema
         ]
         with closing(self.csv_stream) as r:
-            for uncasted_tuple in csv.reader(r.raw,
-                                         delimiter='\t',
-                                         quotechar='"',
-                                         doublequote=True):
-                yield [none_if_throws(caster)(val)
+            # read the raw stream, but still undo the gzip or deflate content encoding of the response
+            r.raw.decode_content = True
+            for uncasted_tuple in dku_csv_reader(dku_text_stream(r.raw)):
+                # fields beyond the schema are padded with a None caster, and read as None
+                yield [caster(val) if caster is not None else None
                        for (caster, val) in dku_zip_longest(casters, uncasted_tuple)]
+
+    def _iter_rows_profiled(self):
+        profile = self.profile
+        column_types = [col["type"] for col in self.schema]
+        casters = [none_if_throws(DKU_CSV_CASTERS.get(t, dku_decode_utf8)) for t in column_types]
+        cast_times = [0.0] * len(casters)
+        start = dku_timer()
+        try:
+            with closing(self.csv_stream) as r:
+                r.raw.decode_content = True
+                stream = io.BufferedReader(_DataikuTimedRawStream(r.raw, profile), 65536)
+                reader = dku_csv_reader(dku_text_stream(stream))
+                while True:
+                    before = dku_timer()
+                    network_before = profile.network_time
+                    try:
+                        uncasted_tuple = next(reader)
+                    except StopIteration:
+                        break
+                    profile.tokenize_time += dku_timer() - before - (profile.network_time - network_before)
+                    row = []
+                    for i in range(max(len(casters), len(uncasted_tuple))):
+                        before = dku_timer()
+                        caster = casters[i] if i < len(casters) else None
+                        val = uncasted_tuple[i] if i < len(uncasted_tuple) else None
+                        row.append(caster(val) if caster is not None else None)
+                        if caster is not None:
+                            cast_times[i] += dku_timer() - before
+                    profile.rows += 1
+                    before = dku_timer()
+                    yield row
+                    profile.consumer_time += dku_timer() - before
+        finally:
+            profile.total_time += dku_timer() - start
+            for (column_type, seconds) in zip(column_types, cast_times):
+                profile.cast_times[column_type] = profile.cast_times.get(column_type, 0.0) + seconds
+            if profile.report_to is not None:
+                profile.report_to.write(profile.report() + "\n")
+
+
+class DataikuColumnBatch(object):
+    """
+    A batch of decoded rows, stored by column
+    """
+    def __init__(self, names, columns):
+        self.names = names
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[0]) if len(self.columns) > 0 else 0
+
+    def get_column(self, name):
+        """Gets the values of a column, as a list"""
+        return self.columns[self.names.index(name)]
+
+    def iter_rows(self):
+        """Iterates over the rows of the batch, each row being a list of values"""
+        for row in zip(*self.columns):
+            yield list(row)
+
+
+def dku_split_tsv_records(raw, chunk_size):
+    """
+    Reads a TSV byte stream in blocks of about ``chunk_size`` bytes, and yields chunks that end on a record
+    boundary. A newline ends a record only outside of a quoted field, ie. after an even number of quotes,
+    since quotes inside quoted fields are doubled.
+    """
+    carry = b""
+    while True:
+        block = raw.read(chunk_size)
+        if not block:
+            break
+        data = carry + block if len(carry) > 0 else block
+        # chunks start on a record boundary, so the quotes before a newline must be even for it to end a record
+        cut = data.rfind(b"\n")
+        odd = cut >= 0 and data.count(b'"', 0, cut) % 2 == 1
+        while odd:
+            previous = data.rfind(b"\n", 0, cut)
+            if data.count(b'"', previous + 1, cut) % 2 == 1:
+                odd = False
+            cut = previous
+            if cut < 0:
+                break
+        if cut < 0:
+            carry = data
+            continue
+        yield data[:cut + 1]
+        carry = data[cut + 1:]
+    if len(carry) > 0:
+        yield carry
+
+
+def dku_decode_tsv_chunk(types, chunk):
+    """
+    Decodes a chunk of whole TSV records, and returns the values cast according to the column types,
+    as a list of columns. Runs in the decoding processes of :meth:`DataikuStreamedHttpUTF8CSVReader.iter_column_batches`
+    """
+    casters = [none_if_throws(DKU_CSV_CASTERS.get(t, dku_decode_utf8)) for t in types]
+    columns = [[] for t in types]
+    for uncasted_tuple in dku_csv_reader(dku_chunk_stream(chunk)):
+        for i in range(len(casters)):
+            columns[i].append(casters[i](uncasted_tuple[i] if i < len(uncasted_tuple) else None))
+    return columns
+
+
+class _DataikuHashingWriter(object):
+    """Wraps a file to count and hash the bytes written to it"""
+    def __init__(self, f, hash):
+        self.f = f
+        self.hash = hash
+        self.size = 0
+
+    def write(self, data):
+        if self.hash is not None:
+            self.hash.update(data)
+        self.size += len(data)
+        self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def dku_iter_stream_chunks(raw, buf):
+    """
+    Reads a raw byte stream into a preallocated buffer, and yields views of the buffer holding each chunk read.
+    Each chunk must be consumed before the next one is read.
+
+    When the stream is a response whose gzip or deflate content encoding is undone as it is read, the decoded
+    chunks are yielded as they come instead, since their size is not bounded by the size of the buffer (urllib3 < 2
+    grows the buffer in this case, which fails while a view of it exists)
+    """
+    encoding = (getattr(raw, "headers", None) or {}).get("Content-Encoding", None)
+    if getattr(raw, "decode_content", False) and encoding not in (None, "", "identity"):
+        for chunk in raw.stream(len(buf), decode_content=True):
+            yield chunk
+        return
+    view = memoryview(buf)
+    while True:
+        n = raw.readinto(buf)
+        if not n:
+            break
+        yield view[:n]
+
+
+def dku_copy_stream_to_file(raw, f, buffer_size=1048576, compression=None, checksum=True):
+    """
+    Copies a raw byte stream to a file, without decoding it, through a single preallocated buffer
+
+    :param raw: the stream to read, which must support ``readinto``, or a urllib3 response
+    :param f: the file-like object to write to, opened in binary mode
+    :param int buffer_size: the size in bytes of the reads and writes
+    :param str compression: (optional) "gzip" to compress the data on the fly
+    :param bool checksum: whether to compute the SHA-256 of the written bytes
+    :returns: a dict with the number of bytes read ("bytesRead"), of bytes written ("bytesWritten") and
+              the hex SHA-256 of the written bytes ("sha256", None if ``checksum`` is False)
+    """
+    if compression not in (None, "gzip"):
+        raise ValueError("Unsupported compression: %s" % compression)
+    writer = _DataikuHashingWriter(f, hashlib.sha256() if checksum else None)
+    out = gzip.GzipFile(fileobj=writer, mode="wb", mtime=0) if compression == "gzip" else writer
+    read = 0
+    try:
+        for chunk in dku_iter_stream_chunks(raw, bytearray(buffer_size)):
+            read += len(chunk)
+            out.write(chunk)
+    finally:
+        if compression == "gzip":
+            out.close()
+    return {
+        "bytesRead" : read,
+        "bytesWritten" : writer.size,
+        "sha256" : writer.hash.hexdigest() if checksum else None
+    }
+
+
+class DataikuMultipartFileStream(object):
+    """
+    The body of a multipart/form-data upload of a single file, read from the file as it is sent, so
+    that the file is never loaded in memory. Its size must be known in advance
+    """
+    def __init__(self, name, f, size, field="file"):
+        boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=%s" % boundary
+        head = ("--%s\r\nContent-Disposition: form-data; name=\"%s\"; filename=\"%s\"\r\n"
+                "Content-Type: application/octet-stream\r\nExpires: 0\r\n\r\n" % (boundary, field, name.replace("\"", "%22"))).encode("utf-8")
+        tail = ("\r\n--%s--\r\n" % boundary).encode("utf-8")
+        self.length = len(head) + size + len(tail)
+        self.parts = deque([io.BytesIO(head), f, io.BytesIO(tail)])
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        chunks = []
+        while len(self.parts) > 0 and (size < 0 or size > 0):
+            data = self.parts[0].read(size)
+            if not data:
+                self.parts.popleft()
+                continue
+            chunks.append(data)
+            if size > 0:
+                size -= len(data)
+        return b"".join(chunks)
+
+
+def dku_gzip_compress(data, level=6):
+    """Compresses bytes in the gzip format"""
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=level) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class DataikuRateLimiter(object):
+    """
+    A thread-safe limiter spreading calls so that at most ``max_per_second`` of them start every second.
+
+    Use it to avoid flooding a single DSS host when running many calls concurrently
+    """
+    def __init__(self, max_per_second):
+        self.interval = 1.0 / max_per_second if max_per_second else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the next call is allowed to start"""
+        if self.interval <= 0:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def dku_parallel_imap(fn, items, parallelism=4, retries=0, retry_delay=1, rate_limiter=None):
+    """
+    Applies ``fn`` to each of ``items`` on a bounded pool of threads, and yields a tuple
+    ``(item, result, error)`` for each item as soon as it completes. ``error`` is None when
+    the call succeeded, and the last exception raised otherwise (``result`` is then None).
+
+    Each failing call is retried up to ``retries`` times, waiting ``retry_delay`` seconds in between.
+    Closing the returned generator early stops the workers from picking up new items.
+    """
+    items = list(items)
+    if len(items) == 0:
+        return
+    todo = dku_queue.Queue()
+    for item in items:
+        todo.put(item)
+    done = dku_queue.Queue()
+    stopped = threading.Event()
+
+    def work():
+        while not stopped.is_set():
+            try:
+                item = todo.get_nowait()
+            except dku_queue.Empty:
+                return
+            attempt = 0
+            while True:
+                try:
+                    if rate_limiter is not None:
+                        rate_limiter.acquire()
+                    done.put((item, fn(item), None))
+                    break
+                except Exception as e:
+                    if attempt >= retries or stopped.is_set():
+                        done.put((item, None, e))
+                        break
+                    attempt += 1
+                    time.sleep(retry_delay)
+
+    workers = [threading.Thread(target=work) for i in range(max(1, min(parallelism, len(items))))]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        for i in range(len(items)):
+            yield done.get()
+    finally:
+        stopped.set()
@@ -0,0 +1,72 @@
+from dataikuapi.dss.backup import DSSProjectsExporter
+from nose.tools import ok_
+from nose.tools import eq_
+import io
+
+class FakeProject(object):
+	def __init__(self, project_key, exported):
+		self.project_key = project_key
+		self.exported = exported
+
+	def export_to_file_object(self, f, options={}, retries=3):
+		self.exported.append(self.project_key)
+		f.write(b"zip")
+		return {"bytesWritten" : 3, "sha256" : "x"}
+
+class FakeClient(object):
+	def __init__(self, projects):
+		self.projects = projects
+		self.exported = []
+		self.pool_size = None
+
+	def list_projects(self):
+		return self.projects
+
+	def get_project(self, project_key):
+		return FakeProject(project_key, self.exported)
+
+	def _ensure_connection_pool_size(self, size):
+		self.pool_size = size
+
+class MemorySink(object):
+	def __init__(self):
+		self.files = {}
+		self.manifest = None
+
+	def open(self, name):
+		return io.BytesIO()
+
+	def commit(self, name, f):
+		self.files[name] = f.getvalue()
+
+	def abort(self, name, f):
+		pass
+
+	def exists(self, name):
+		return name in self.files
+
+	def read_manifest(self):
+		return self.manifest
+
+	def write_manifest(self, manifest):
+		self.manifest = manifest
+
+def partial_export_keeps_other_projects_test():
+	client = FakeClient([{"projectKey" : "A", "versionTag" : {"versionNumber" : 1}}, {"projectKey" : "B", "versionTag" : {"versionNumber" : 1}}])
+	sink = MemorySink()
+	exporter = DSSProjectsExporter(client, parallelism=2, retries=0)
+	manifest = exporter.export(sink)
+	eq_(sorted(manifest["projects"].keys()), ["A", "B"])
+	eq_(client.pool_size, 2)
+
+	# exporting only A keeps the entry of B
+	manifest = exporter.export(sink, project_keys=["A"], skip_unchanged=False)
+	eq_(sorted(manifest["projects"].keys()), ["A", "B"])
+	eq_(manifest["projects"]["B"]["status"], "DONE")
+
+	# so that the next full run still skips B
+	del client.exported[:]
+	client.projects[0]["versionTag"] = {"versionNumber" : 2}
+	manifest = exporter.export(sink)
+	eq_(client.exported, ["A"])
+	eq_(manifest["projects"]["B"]["status"], "UNCHANGED")
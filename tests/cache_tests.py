@@ -0,0 +1,124 @@
+from dataikuapi import cache
+from dataikuapi.cache import DSSResponseCache
+from nose.tools import ok_
+from nose.tools import eq_
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 1000.0
+
+	def time(self):
+		return self.now
+
+class Fetcher(object):
+	"""Returns a new response each time it is called, and counts the calls"""
+	def __init__(self, path):
+		self.path = path
+		self.calls = 0
+
+	def __call__(self):
+		self.calls += 1
+		return {"path" : self.path, "call" : self.calls, "items" : [{"name" : "a"}]}
+
+def get(c, path, fetchers, params=None):
+	if path not in fetchers:
+		fetchers[path] = Fetcher(path)
+	return c.fetch(path, params, None, fetchers[path])
+
+def with_clock(test):
+	def run():
+		clock = FakeClock()
+		time_module = cache.time
+		cache.time = clock
+		try:
+			test(clock)
+		finally:
+			cache.time = time_module
+	run.__name__ = test.__name__
+	return run
+
+@with_clock
+def ttl_expiry_test(clock):
+	c = DSSResponseCache(ttls={"/projects/*/recipes/" : 10})
+	fetchers = {}
+	eq_(get(c, "/projects/P/recipes/", fetchers)["call"], 1)
+	clock.now += 9
+	eq_(get(c, "/projects/P/recipes/", fetchers)["call"], 1)
+	clock.now += 2
+	eq_(get(c, "/projects/P/recipes/", fetchers)["call"], 2)
+	# not cached by default
+	eq_(get(c, "/projects/P/jobs/", fetchers)["call"], 1)
+	eq_(get(c, "/projects/P/jobs/", fetchers)["call"], 2)
+
+def get_ttl_test():
+	c = DSSResponseCache(ttls={"/projects/P/datasets/" : 5}, default_ttl=1)
+	eq_(c.get_ttl("/projects/P/datasets/"), 5)
+	eq_(c.get_ttl("/projects/Q/datasets/"), 30)
+	eq_(c.get_ttl("/projects/Q/datasets/d/schema"), 30)
+	eq_(c.get_ttl("/projects/Q/"), 1)
+
+def params_test():
+	c = DSSResponseCache(default_ttl=60)
+	fetchers = {}
+	eq_(get(c, "/x", fetchers, params={"a" : 1, "b" : 2})["call"], 1)
+	eq_(get(c, "/x", fetchers, params={"b" : 2, "a" : 1})["call"], 1)
+	eq_(get(c, "/x", fetchers, params={"a" : 2})["call"], 2)
+
+def copies_test():
+	c = DSSResponseCache(default_ttl=60)
+	fetchers = {}
+	get(c, "/x", fetchers)["items"][0]["name"] = "modified"
+	eq_(get(c, "/x", fetchers)["items"][0]["name"], "a")
+	get(c, "/x", fetchers)["items"].append(None)
+	eq_(len(get(c, "/x", fetchers)["items"]), 1)
+
+def lru_eviction_test():
+	c = DSSResponseCache(default_ttl=60, max_entries=2)
+	fetchers = {}
+	get(c, "/a", fetchers)
+	get(c, "/b", fetchers)
+	# "/a" becomes the most recently used, so "/b" is evicted
+	get(c, "/a", fetchers)
+	get(c, "/c", fetchers)
+	eq_(len(c.entries), 2)
+	eq_(get(c, "/a", fetchers)["call"], 1)
+	eq_(get(c, "/b", fetchers)["call"], 2)
+	eq_(fetchers["/c"].calls, 1)
+
+def invalidate_test():
+	c = DSSResponseCache(default_ttl=60)
+	paths = ["/projects/P/", "/projects/P/datasets/", "/projects/P/datasets/d", "/projects/P/datasets/d/schema",
+		"/projects/P/datasets/dd", "/projects/P/recipes/", "/projects/PP/datasets/d"]
+	fetchers = {}
+	for path in paths:
+		get(c, path, fetchers)
+	c.invalidate("/projects/P/datasets/d")
+	refetched = [path for path in paths if get(c, path, fetchers)["call"] == 2]
+	# the path, its parents and its sub-resources, but not its siblings or the paths sharing a prefix
+	eq_(refetched, ["/projects/P/", "/projects/P/datasets/", "/projects/P/datasets/d", "/projects/P/datasets/d/schema"])
+
+def clear_test():
+	c = DSSResponseCache(default_ttl=60)
+	fetchers = {}
+	get(c, "/a", fetchers)
+	c.clear()
+	eq_(get(c, "/a", fetchers)["call"], 2)
+
+class FakeHttpResponse(object):
+	content = b"{}"
+
+	def raise_for_status(self):
+		pass
+
+def write_invalidates_after_request_test():
+	from dataikuapi.dssclient import DSSClient
+	client = DSSClient("http://localhost:8082", "key")
+	client.enable_response_cache(default_ttl=60)
+	path = "/projects/P/datasets/d"
+	def request(method, url, **kwargs):
+		# a concurrent GET caches the data while the write is in flight
+		client._response_cache.fetch(path, None, None, lambda: {"stale" : True})
+		return FakeHttpResponse()
+	client._session.request = request
+	client._perform_json("PUT", path, body={})
+	eq_(client._response_cache.fetch(path, None, None, lambda: {"stale" : False}), {"stale" : False})
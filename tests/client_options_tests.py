@@ -0,0 +1,61 @@
+from dataikuapi.dssclient import DSSClient
+from dataikuapi.apinode_client import APINodeClient
+from nose.tools import ok_
+from nose.tools import eq_
+from unittest import SkipTest
+
+host="http://localhost:8082"
+apiKey="ZZYqWxPnc2nWMJMUXwykn6wzA7jokbp5"
+
+def clients():
+	return [DSSClient(host, apiKey), APINodeClient(host, "service", apiKey)]
+
+def enable_all(client, hook):
+	client.set_json_codec("json")
+	client.add_request_hook(hook)
+	client.enable_request_compression(min_size=10)
+	try:
+		client.enable_tracing()
+	except ImportError:
+		raise SkipTest("opentelemetry-api is not installed")
+
+def toggle_compression_test():
+	for client in clients():
+		hook = lambda event: None
+		enable_all(client, hook)
+		client.disable_request_compression()
+		eq_(client._request_compression, None)
+		eq_(client._request_hooks, [hook])
+		ok_(client._tracing is not None)
+		client.enable_request_compression()
+		eq_(client._request_compression, (1048576, 6))
+
+def toggle_request_hooks_test():
+	for client in clients():
+		hook = lambda event: None
+		enable_all(client, hook)
+		client.remove_request_hook(hook)
+		eq_(client._request_hooks, [])
+		eq_(client._request_compression, (10, 6))
+		ok_(client._tracing is not None)
+
+def toggle_tracing_test():
+	for client in clients():
+		hook = lambda event: None
+		enable_all(client, hook)
+		client.disable_tracing()
+		eq_(client._tracing, None)
+		eq_(client._request_hooks, [hook])
+		eq_(client._request_compression, (10, 6))
+
+def toggle_json_codec_test():
+	for client in clients():
+		hook = lambda event: None
+		enable_all(client, hook)
+		codec = client._json_codec
+		client.set_json_codec("auto")
+		client.set_json_codec("json")
+		eq_(client._json_codec.name, codec.name)
+		eq_(client._request_hooks, [hook])
+		eq_(client._request_compression, (10, 6))
+		ok_(client._tracing is not None)
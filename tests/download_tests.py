@@ -0,0 +1,108 @@
+from dataikuapi.utils import dku_copy_stream_to_file
+from nose.tools import ok_
+from nose.tools import eq_
+from requests.packages.urllib3.response import HTTPResponse
+import gzip, hashlib, io, os
+
+data = os.urandom(100000) + b"x" * 300000
+
+def gzip_bytes(raw):
+	out = io.BytesIO()
+	with gzip.GzipFile(fileobj=out, mode="wb") as f:
+		f.write(raw)
+	return out.getvalue()
+
+def response(body, headers=None):
+	return HTTPResponse(body=io.BytesIO(body), headers=headers or {}, preload_content=False, decode_content=True)
+
+def copy_stream_test():
+	out = io.BytesIO()
+	result = dku_copy_stream_to_file(response(data), out, buffer_size=4096)
+	eq_(out.getvalue(), data)
+	eq_(result["bytesWritten"], len(data))
+	eq_(result["sha256"], hashlib.sha256(data).hexdigest())
+
+def copy_content_encoded_stream_test():
+	# the decoded chunks are larger than the buffer
+	out = io.BytesIO()
+	result = dku_copy_stream_to_file(response(gzip_bytes(data), {"Content-Encoding" : "gzip"}), out, buffer_size=4096)
+	eq_(out.getvalue(), data)
+	eq_(result["bytesRead"], len(data))
+	eq_(result["sha256"], hashlib.sha256(data).hexdigest())
+
+def copy_stream_compressed_test():
+	out = io.BytesIO()
+	result = dku_copy_stream_to_file(response(data), out, buffer_size=4096, compression="gzip")
+	eq_(gzip.GzipFile(fileobj=io.BytesIO(out.getvalue())).read(), data)
+	eq_(result["bytesWritten"], len(out.getvalue()))
+
+class InterruptedBody(io.BytesIO):
+	"""A response body whose connection is lost after its data, which should be a multiple of the download buffer size"""
+	def read(self, *args):
+		chunk = io.BytesIO.read(self, *args)
+		if not chunk:
+			raise IOError("Connection reset")
+		return chunk
+
+class FakeDownloadResponse(object):
+	def __init__(self, body, status_code=200, headers=None, cut=None):
+		self.status_code = status_code
+		self.headers = headers or {}
+		raw_headers = dict((k, v) for (k, v) in self.headers.items() if k != "Content-Length")
+		body = InterruptedBody(body[:cut]) if cut is not None else io.BytesIO(body)
+		self.raw = HTTPResponse(body=body, headers=raw_headers, preload_content=False, decode_content=True)
+
+	def close(self):
+		self.raw.close()
+
+def download(responses):
+	from dataikuapi.dssclient import DSSClient
+	client = DSSClient("http://localhost:8082", "key")
+	requests = []
+	def perform_raw(method, path, params=None, body=None, headers=None):
+		requests.append(headers)
+		return responses.pop(0)
+	client._perform_raw = perform_raw
+	out = io.BytesIO()
+	result = client._download_to_file("POST", "/projects/P/export", out, buffer_size=4096, retry_delay=0)
+	return (out.getvalue(), result, requests)
+
+def full_headers(extra):
+	headers = {"Content-Length" : str(len(data)), "Accept-Ranges" : "bytes"}
+	headers.update(extra)
+	return headers
+
+def resume_with_validator_test():
+	(out, result, requests) = download([
+		FakeDownloadResponse(data, headers=full_headers({"ETag" : '"v1"'}), cut=8192),
+		FakeDownloadResponse(data[8192:], status_code=206, headers={"Content-Range" : "bytes 8192-%d/%d" % (len(data) - 1, len(data))})])
+	eq_(out, data)
+	eq_(requests[1], {"Range" : "bytes=8192-", "If-Range" : '"v1"'})
+	eq_(result["resumed"], 1)
+	eq_(result["sha256"], hashlib.sha256(data).hexdigest())
+
+def restart_when_validator_changed_test():
+	# DSS sends the whole new response when the If-Range validator does not match anymore
+	new_data = data[::-1]
+	(out, result, requests) = download([
+		FakeDownloadResponse(data, headers=full_headers({"Last-Modified" : "Mon, 1 Jan 2018 00:00:00 GMT"}), cut=8192),
+		FakeDownloadResponse(new_data, headers=full_headers({"Last-Modified" : "Tue, 2 Jan 2018 00:00:00 GMT"}))])
+	eq_(out, new_data)
+	eq_(requests[1]["If-Range"], "Mon, 1 Jan 2018 00:00:00 GMT")
+	eq_(result["resumed"], 0)
+	eq_(result["sha256"], hashlib.sha256(new_data).hexdigest())
+
+def no_resume_without_validator_test():
+	(out, result, requests) = download([
+		FakeDownloadResponse(data, headers=full_headers({"ETag" : 'W/"weak"'}), cut=8192),
+		FakeDownloadResponse(data, headers=full_headers({}))])
+	eq_(out, data)
+	eq_(requests, [None, None])
+
+def no_resume_when_content_encoded_test():
+	encoded = gzip_bytes(data)
+	(out, result, requests) = download([
+		FakeDownloadResponse(encoded, headers={"Content-Encoding" : "gzip", "Accept-Ranges" : "bytes", "ETag" : '"v1"'}, cut=len(encoded) // 2),
+		FakeDownloadResponse(encoded, headers={"Content-Encoding" : "gzip", "Accept-Ranges" : "bytes", "ETag" : '"v1"'})])
+	eq_(out, data)
+	eq_(requests, [None, None])
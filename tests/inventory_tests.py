@@ -0,0 +1,38 @@
+from dataikuapi.dssclient import DSSClient
+from dataikuapi.dss.inventory import DSSInventorySQLiteSink
+from nose.tools import ok_
+from nose.tools import eq_
+
+host="http://localhost:8082"
+apiKey="ZZYqWxPnc2nWMJMUXwykn6wzA7jokbp5"
+
+def fake_client(projects, calls):
+	client = DSSClient(host, apiKey)
+	def perform_json(method, path, params=None, body=None, **kwargs):
+		calls.append(path)
+		if path == "/projects/":
+			return projects
+		elif path.endswith("/metadata"):
+			return {"label" : path.split("/")[2]}
+		elif path.endswith("/datasets/"):
+			return [{"name" : "d", "type" : "Filesystem", "managed" : True, "tags" : []}]
+		return []
+	client._perform_json = perform_json
+	return client
+
+def sqlite_sink_incremental_crawl_test():
+	projects = [{"projectKey" : "A", "versionTag" : {"versionNumber" : 1}}, {"projectKey" : "B", "versionTag" : {"versionNumber" : 1}}]
+	calls = []
+	client = fake_client(projects, calls)
+	sink = client.crawl_projects_inventory(sink=DSSInventorySQLiteSink(":memory:"))
+	index = sink.load_index()
+	eq_(sorted(index.list_project_keys()), ["A", "B"])
+	eq_(index.find_items("datasets", "d")[0][1]["type"], "Filesystem")
+
+	# only the changed project is crawled again
+	projects[1]["versionTag"] = {"versionNumber" : 2}
+	del calls[:]
+	sink = client.crawl_projects_inventory(sink=sink, previous=index)
+	ok_(all(path == "/projects/" or path.startswith("/projects/B/") for path in calls))
+	eq_(sink.load_index().get("B")["versionTag"], {"versionNumber" : 2})
+	sink.close()
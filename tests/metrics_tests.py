@@ -0,0 +1,135 @@
+from dataikuapi.dss.metrics import ComputedMetrics, DSSMetricTimeSeries
+from nose.tools import ok_
+from nose.tools import eq_
+from nose.tools import raises
+import math
+
+def history(values, value_type="BIGINT"):
+	return {"valueType" : value_type, "values" : [{"time" : t, "value" : v} for (t, v) in values]}
+
+def series(values, value_type="BIGINT"):
+	return DSSMetricTimeSeries.from_history("records:COUNT_RECORDS", "NP", history(values, value_type))
+
+def from_history_test():
+	s = series([(3000, 30), (1000, 10), (2000, None)])
+	eq_(list(s.times), [1000, 2000, 3000])
+	ok_(s.is_numerical())
+	eq_(s.values[0], 10)
+	ok_(math.isnan(s.values[1]))
+	eq_(len(s), 3)
+	s = series([(1000, "a"), (2000, "b")], value_type="STRING")
+	ok_(not s.is_numerical())
+	eq_(list(s.values), ["a", "b"])
+	eq_(len(series([])), 0)
+
+def downsample_test():
+	s = series([(0, 1), (500, 2), (1000, 3), (2500, 4), (2999, 5)])
+	expected = {"first" : [1, 3, 4], "last" : [2, 3, 5], "count" : [2, 1, 2], "min" : [1, 3, 4],
+		"max" : [2, 3, 5], "sum" : [3, 3, 9], "mean" : [1.5, 3, 4.5]}
+	for (how, values) in expected.items():
+		d = s.downsample(1000, how=how)
+		eq_(list(d.times), [0, 1000, 2000])
+		eq_(list(d.values), values)
+
+def downsample_empty_test():
+	s = series([])
+	for how in ["first", "last", "count", "min", "max", "sum", "mean"]:
+		d = s.downsample(1000, how=how)
+		eq_(len(d.times), 0)
+		eq_(len(d.values), 0)
+
+def downsample_non_numerical_test():
+	s = series([(0, "a"), (10, "b"), (2000, "c")], value_type="STRING")
+	eq_(list(s.downsample(1000, how="last").values), ["b", "c"])
+	eq_(list(s.downsample(1000, how="count").values), [2, 1])
+
+@raises(ValueError)
+def downsample_non_numerical_sum_test():
+	series([(0, "a")], value_type="STRING").downsample(1000, how="sum")
+
+@raises(ValueError)
+def downsample_unsupported_test():
+	series([]).downsample(1000, how="median")
+
+def rolling_test():
+	s = series([(0, 1), (1, 5), (2, 3), (3, 4)])
+	expected = {"sum" : [6, 8, 7], "mean" : [3, 4, 3.5], "min" : [1, 3, 3], "max" : [5, 5, 4], "count" : [2, 2, 2]}
+	for (how, values) in expected.items():
+		r = s.rolling(2, how=how)
+		eq_(list(r.times), [1, 2, 3])
+		eq_(list(r.values), values)
+	eq_(len(s.rolling(5)), 0)
+	eq_(len(series([]).rolling(1)), 0)
+
+def get_values_from_data_test():
+	values = ComputedMetrics.get_values_from_data([{"dataType" : "BIGINT", "value" : "3"}, {"dataType" : "BIGINT", "value" : "4"}])
+	eq_(values.dtype.name, "int64")
+	eq_(list(values), [3, 4])
+	values = ComputedMetrics.get_values_from_data([{"dataType" : "BIGINT", "value" : "3"}, None])
+	eq_(list(values), [3, None])
+	values = ComputedMetrics.get_values_from_data([None, {"dataType" : "DOUBLE", "value" : "0.5"}])
+	eq_(values.dtype.name, "float64")
+	ok_(math.isnan(values[0]))
+	eq_(values[1], 0.5)
+	values = ComputedMetrics.get_values_from_data([{"dataType" : "STRING", "value" : "x"}])
+	eq_(list(values), ["x"])
+	eq_(len(ComputedMetrics.get_values_from_data([])), 0)
+
+class FakeClient(object):
+	def _ensure_connection_pool_size(self, size):
+		pass
+
+class FakeDataset(object):
+	def __init__(self, name, log, fail_metrics=False):
+		import threading
+		self.client = FakeClient()
+		self.project_key = "PROJECT"
+		self.dataset_name = name
+		self.log = log
+		self.lock = threading.Lock()
+		self.fail_metrics = fail_metrics
+
+	def _record(self, event):
+		with self.lock:
+			self.log.append((self.dataset_name, event))
+
+	def compute_metrics(self, partition=''):
+		import time
+		self._record("metrics start")
+		time.sleep(0.05)
+		self._record("metrics end")
+		if self.fail_metrics:
+			raise Exception("failed")
+		return {"result" : {"computed" : [{"metricId" : "records:COUNT_RECORDS", "value" : "3", "dataType" : "BIGINT"}]}}
+
+	def run_checks(self, partition=''):
+		self._record("checks start")
+		self._record("checks end")
+		return {"result" : {"results" : []}}
+
+def runner_order_test():
+	from dataikuapi.dss.metrics import DSSMetricsChecksRunner
+	log = []
+	datasets = [FakeDataset("d%d" % i, log) for i in range(4)]
+	report = DSSMetricsChecksRunner(parallelism=8, retries=0).run([(d, '') for d in datasets])
+	for d in datasets:
+		events = [event for (name, event) in log if name == d.dataset_name]
+		eq_(events, ["metrics start", "metrics end", "checks start", "checks end"])
+	eq_(report.get_errors(), [])
+	eq_(report.get_computed_metrics("PROJECT.d0").get_global_value("records:COUNT_RECORDS"), 3)
+
+def runner_failed_metrics_test():
+	from dataikuapi.dss.metrics import DSSMetricsChecksRunner
+	log = []
+	report = DSSMetricsChecksRunner(retries=1, retry_delay=0).run([(FakeDataset("d", log, fail_metrics=True), '')])
+	# the metrics are retried, and the checks are skipped
+	eq_([event for (name, event) in log], ["metrics start", "metrics end"] * 2)
+	eq_([e["action"] for e in report.get_errors()], ["computeMetrics", "runChecks"])
+
+def rolling_missing_value_test():
+	s = series([(i, v) for (i, v) in enumerate([1, 2, None, 4, 5, 6, 7])])
+	for how in ["sum", "mean", "min", "max"]:
+		values = s.rolling(2, how=how).values
+		ok_(math.isnan(values[1]) and math.isnan(values[2]))
+		eq_([v for (i, v) in enumerate(values) if i not in (1, 2)],
+			{"sum" : [3, 9, 11, 13], "mean" : [1.5, 4.5, 5.5, 6.5], "min" : [1, 4, 5, 6], "max" : [2, 5, 6, 7]}[how])
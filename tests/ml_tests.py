@@ -0,0 +1,96 @@
+from dataikuapi.dss.ml import DSSTreeSet, DSSMLTaskLeaderboard
+from nose.tools import ok_
+from nose.tools import eq_
+from nose.tools import raises
+import numpy as np
+
+def tree(left, right, feature, threshold, predict, left_categories=None):
+	return {"leftChild" : left, "rightChild" : right, "feature" : feature, "threshold" : threshold, "predict" : predict,
+		"leftCategories" : left_categories or [None] * len(left), "impurity" : [0.0] * len(left), "nSamples" : [1] * len(left)}
+
+def forest():
+	return DSSTreeSet({"featureNames" : ["x", "y", "z"], "trees" : [
+		# x <= 0.5 ? (y <= 2 ? 1 : 2) : 3
+		tree([1, 3, -1, -1, -1], [2, 4, -1, -1, -1], [0, 1, None, None, None], [0.5, 2.0, None, None, None], [0, 0, 3.0, 1.0, 2.0]),
+		# z <= -1 ? 10 : (x <= 1.5 ? 20 : 30)
+		tree([1, -1, 3, -1, -1], [2, -1, 4, -1, -1], [2, None, 0, None, None], [-1.0, None, 1.5, None, None], [0, 10.0, 0, 20.0, 30.0]),
+		# a single leaf
+		tree([-1], [-1], [None], [None], [5.0])]})
+
+def walk(tree, sample):
+	# the reference scoring, one node at a time. NaN comparisons are false, so missing values go right
+	node = tree.get_root()
+	while node.get_left_child() is not None:
+		info = node.get_split_info()
+		value = sample[tree.feature_names.index(info["feature"])]
+		node = node.get_left_child() if value <= info["threshold"] else node.get_right_child()
+	return tree.get_raw()["predict"][node.i]
+
+def samples():
+	rng = np.random.RandomState(0)
+	X = rng.uniform(-3, 3, size=(200, 3))
+	X[rng.uniform(size=X.shape) < 0.2] = np.nan
+	# the thresholds themselves go left
+	return np.vstack([X, [[0.5, 2.0, -1.0], [1.5, np.nan, np.nan]]])
+
+def predict_test():
+	trees = forest()
+	X = samples()
+	expected = np.array([[walk(t, x) for x in X] for t in trees.get_trees()])
+	eq_(trees.predict(X, aggregation=None).tolist(), expected.tolist())
+	ok_(np.allclose(trees.predict(X), expected.mean(axis=0)))
+	ok_(np.allclose(trees.predict(X, aggregation="sum"), expected.sum(axis=0)))
+	for (i, t) in enumerate(trees.get_trees()):
+		eq_(t.predict(X).tolist(), expected[i].tolist())
+	eq_(trees.predict(X[0]).shape, (1,))
+
+@raises(ValueError)
+def predict_category_splits_test():
+	trees = DSSTreeSet({"featureNames" : ["x"], "trees" : [
+		tree([1, -1, -1], [2, -1, -1], [0, None, None], [None, None, None], [0, 1.0, 2.0], left_categories=[["a"], None, None])]})
+	ok_(trees.get_trees()[0].has_category_splits())
+	trees.predict(np.zeros((1, 1)))
+
+class FakeMLTask(object):
+	def __init__(self, session_id):
+		self.session_id = session_id
+		self.deployed = []
+
+	def start_train(self, session_name=None, session_description=None):
+		return {"sessionId" : self.session_id} if self.session_id is not None else {}
+
+	def get_status(self):
+		return {"training" : False, "fullModelIds" : [
+			{"id" : "old", "fullModelId" : {"sessionId" : "s0"}},
+			{"id" : "new", "fullModelId" : {"sessionId" : "s1"}}]}
+
+	def get_leaderboard(self, session_id=None):
+		ok_(session_id is not None)
+		snippets = {"old" : {"auc" : 0.9, "sessionId" : "s0"}, "new" : {"auc" : 0.8, "sessionId" : "s1"}}
+		return DSSMLTaskLeaderboard(self, dict((k, v) for (k, v) in snippets.items() if v["sessionId"] == session_id))
+
+	def deploy_to_flow(self, model_id, **kwargs):
+		self.deployed.append(model_id)
+		return {"savedModelId" : "sm"}
+
+def trainer_test():
+	from dataikuapi.dss.ml import DSSMLTasksTrainer
+	trainer = DSSMLTasksTrainer(poll_interval=0)
+	mltask = FakeMLTask("s1")
+	trainer.add(mltask, metric="auc", deploy={"model_name" : "m", "train_dataset" : "d"})
+	outcome = trainer.run_all()[0]
+	eq_(outcome["error"], None)
+	eq_(outcome["modelIds"], ["new"])
+	eq_(outcome["bestModelId"], "new")
+	eq_(mltask.deployed, ["new"])
+
+def trainer_without_session_id_test():
+	from dataikuapi.dss.ml import DSSMLTasksTrainer
+	from dataikuapi.utils import DataikuException
+	trainer = DSSMLTasksTrainer(poll_interval=0)
+	mltask = FakeMLTask(None)
+	trainer.add(mltask, metric="auc", deploy={"model_name" : "m", "train_dataset" : "d"})
+	outcome = trainer.run_all()[0]
+	ok_(isinstance(outcome["error"], DataikuException))
+	eq_(outcome["bestModelId"], None)
+	eq_(mltask.deployed, [])
@@ -36,6 +36,16 @@ def project_create_delete_test():
 	p.delete()
 	eq_(count, len(client.list_project_keys()))
 
+def projects_inventory_test():
+	client = DSSClient(host, apiKey)
+	index = client.crawl_projects_inventory(parallelism=4)
+	eq_(len(client.list_project_keys()), len(index.list_project_keys()))
+	ok_(index.get(testProjectKey)["datasets"] is not None)
+
+	# nothing changed, so everything is reused from the previous crawl
+	index2 = client.crawl_projects_inventory(previous=index)
+	eq_(index.get(testProjectKey)["crawlTime"], index2.get(testProjectKey)["crawlTime"])
+
 
 """
 def sql_test():
@@ -0,0 +1,91 @@
+from dataikuapi.utils import DataikuStreamedHttpUTF8CSVReader
+from nose.tools import ok_
+from nose.tools import eq_
+import io
+
+class FakeResponse(object):
+	def __init__(self, data):
+		self.raw = io.BytesIO(data)
+		self.closed = False
+
+	def close(self):
+		self.closed = True
+
+def read_rows(schema, data, **kwargs):
+	return list(DataikuStreamedHttpUTF8CSVReader(schema, FakeResponse(data), **kwargs).iter_rows())
+
+def extra_fields_test():
+	schema = [{"name" : "a", "type" : "int"}]
+	eq_(read_rows(schema, b"1\textra\n"), [[1, None]])
+
+def extra_fields_profiled_test():
+	from dataikuapi.utils import DataikuStreamProfile
+	schema = [{"name" : "a", "type" : "int"}]
+	eq_(read_rows(schema, b"1\textra\n", profile=DataikuStreamProfile()), [[1, None]])
+
+def extra_fields_prefetched_test():
+	schema = [{"name" : "a", "type" : "int"}]
+	eq_(read_rows(schema, b"1\textra\n2\n", prefetch=2, batch_size=1), [[1, None], [2]])
+
+class OversizedReadsBody(object):
+	"""Returns more than asked for, as urllib3 < 2 does on content-encoded responses"""
+	def __init__(self, data):
+		self.data = data
+
+	def read(self, size=-1):
+		(data, self.data) = (self.data[:3 * max(size, 1)], self.data[3 * max(size, 1):])
+		return data
+
+def oversized_raw_reads_test():
+	from dataikuapi.utils import DataikuStreamProfile, _DataikuTimedRawStream
+	profile = DataikuStreamProfile()
+	stream = _DataikuTimedRawStream(OversizedReadsBody(b"0123456789"), profile)
+	b = bytearray(4)
+	chunks = []
+	while True:
+		n = stream.readinto(b)
+		if n == 0:
+			break
+		ok_(n <= 4)
+		chunks.append(bytes(b[:n]))
+	eq_(b"".join(chunks), b"0123456789")
+	eq_(profile.bytes_read, 10)
+
+def missing_fields_test():
+	schema = [{"name" : "a", "type" : "int"}, {"name" : "b", "type" : "string"}]
+	eq_(read_rows(schema, b"2\n3\tx\n"), [[2, None], [3, "x"]])
+
+# records with quoted tabs and newlines, doubled quotes, and quotes just before the end of a record
+tricky_schema = [{"name" : "id", "type" : "int"}, {"name" : "text", "type" : "string"}]
+tricky_rows = [[1, "plain"], [2, "multi\nline\nfield"], [3, 'with "doubled" quotes'],
+	[4, '"\n"'], [5, ""], [6, "tab\tand \"quote\"\nand newline"], [7, '""'], [8, "end"]]
+
+def encode_tsv(rows):
+	lines = []
+	for row in rows:
+		text = row[1]
+		if any(c in text for c in '\t\n"'):
+			text = '"%s"' % text.replace('"', '""')
+		lines.append("%s\t%s\n" % (row[0], text))
+	return "".join(lines).encode("utf-8")
+
+def split_tsv_records_test():
+	from dataikuapi.utils import dku_split_tsv_records
+	data = encode_tsv(tricky_rows)
+	for chunk_size in [1, 2, 3, 5, 7, 16, 64, len(data), 4 * len(data)]:
+		chunks = list(dku_split_tsv_records(io.BytesIO(data), chunk_size))
+		eq_(b"".join(chunks), data)
+		for chunk in chunks:
+			# every chunk holds whole records
+			ok_(chunk.endswith(b"\n"))
+			eq_(read_rows(tricky_schema, chunk), [row for row in tricky_rows if encode_tsv([row]) in chunk])
+		eq_(sum(len(read_rows(tricky_schema, chunk)) for chunk in chunks), len(tricky_rows))
+
+def iter_column_batches_test():
+	data = encode_tsv(tricky_rows * 50)
+	for processes in [0, 2]:
+		for chunk_size in [3, 100, len(data)]:
+			reader = DataikuStreamedHttpUTF8CSVReader(tricky_schema, FakeResponse(data))
+			batches = list(reader.iter_column_batches(processes=processes, chunk_size=chunk_size))
+			eq_([row for batch in batches for row in batch.iter_rows()], tricky_rows * 50)
+			eq_(batches[0].names, ["id", "text"])
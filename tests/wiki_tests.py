@@ -0,0 +1,100 @@
+from dataikuapi.dss.wiki import DSSWiki, DSSWikiSettings
+from dataikuapi.utils import DataikuException
+from nose.tools import ok_
+from nose.tools import eq_
+from nose.tools import raises
+import copy
+
+def node(id, *children):
+	return {"id" : id, "children" : list(children)}
+
+def settings():
+	return DSSWikiSettings(None, "PROJECT", {"taxonomy" : [node("a", node("b", node("c")), node("d")), node("e")]})
+
+def move_article_test():
+	s = settings()
+	s.move_article_in_taxonomy("b", "e")
+	eq_(s.settings["taxonomy"], [node("a", node("d")), node("e", node("b", node("c")))])
+	eq_(s.get_article_ancestors("c"), ["b", "e"])
+	s.move_article_in_taxonomy("c")
+	eq_(s.settings["taxonomy"], [node("a", node("d")), node("e", node("b")), node("c")])
+	eq_(s.get_parent_article_id("c"), None)
+	s.move_article_in_taxonomy("a", "c")
+	eq_(s.settings["taxonomy"], [node("e", node("b")), node("c", node("a", node("d")))])
+
+def move_article_errors_test():
+	for (article_id, parent_article_id) in [("a", "c"), ("a", "a"), ("missing", None), ("a", "missing")]:
+		s = settings()
+		try:
+			s.move_article_in_taxonomy(article_id, parent_article_id)
+			ok_(False, "moving %s under %s should fail" % (article_id, parent_article_id))
+		except DataikuException:
+			pass
+		eq_(s.settings["taxonomy"], settings().settings["taxonomy"])
+
+def move_articles_test():
+	s = settings()
+	s.move_articles_in_taxonomy([("d", None), ("c", "d"), ("e", "a")])
+	eq_(s.settings["taxonomy"], [node("a", node("b"), node("e")), node("d", node("c"))])
+	s.move_articles_in_taxonomy({"b" : "c"})
+	eq_(s.get_article_ancestors("b"), ["c", "d"])
+
+def move_articles_rollback_test():
+	s = settings()
+	before = copy.deepcopy(s.settings["taxonomy"])
+	try:
+		s.move_articles_in_taxonomy([("c", "e"), ("e", "c")])
+		ok_(False, "moving e under its descendant should fail")
+	except DataikuException:
+		pass
+	eq_(s.settings["taxonomy"], before)
+	s.move_article_in_taxonomy("c", "e")
+	eq_(s.settings["taxonomy"], [node("a", node("b"), node("d")), node("e", node("c"))])
+
+def move_after_taxonomy_modified_test():
+	s = settings()
+	taxonomy = s.get_taxonomy()
+	s.move_article_in_taxonomy("d", "e")
+	# modify the taxonomy out of the index
+	b = taxonomy[0]["children"].pop(0)
+	taxonomy.insert(0, b)
+	eq_(s.get_parent_article_id("b"), None)
+	s.move_article_in_taxonomy("c", "a")
+	eq_(s.settings["taxonomy"], [node("b"), node("a", node("c")), node("e", node("d"))])
+	# a detached subtree is not in the taxonomy anymore
+	taxonomy.pop(1)
+	ok_(not s.has_article("c"))
+
+@raises(DataikuException)
+def move_detached_article_test():
+	s = settings()
+	taxonomy = s.get_taxonomy()
+	s.move_article_in_taxonomy("e", "d")
+	taxonomy.pop(0)
+	s.move_article_in_taxonomy("b")
+
+class FakeArticleData(object):
+	def __init__(self, article_id):
+		self.article_id = article_id
+
+	def to_record(self):
+		return {"id" : self.article_id}
+
+class ListSink(object):
+	def __init__(self):
+		self.records = []
+		self.closed = False
+
+	def add(self, record):
+		self.records.append(record)
+
+	def close(self):
+		self.closed = True
+
+def export_articles_leaves_sink_open_test():
+	wiki = DSSWiki(None, "PROJECT")
+	wiki.iter_article_data = lambda parallelism=8: iter([FakeArticleData("a"), FakeArticleData("b")])
+	sink = ListSink()
+	eq_(wiki.export_articles(sink), 2)
+	eq_(sink.records, [{"id" : "a"}, {"id" : "b"}])
+	ok_(not sink.closed)